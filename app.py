@@ -1,8 +1,25 @@
-from typing import Dict
-from llm import retrieve_cards, build_prompt, call_ollama, extract_sql
-from sqlguard import is_safe
-from executor import run_sql
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from llm import retrieve_cards, assemble_prompt, build_prompt, call_ollama, extract_sql
+from sqlguard import is_safe, validate
+from executor import run_sql_stream
+from embeddings import embed_queries
+from sql_cache import sql_cache
+from candidates import SQL_CANDIDATES, generate_sql
+from preflight import PreflightError, preflight
+from rollups import ROLLUP_REWRITE, rewrite_to_rollup
+from repair import SCHEMA_REPAIR, schema_repair
+from result_cache import RESULT_CACHE, result_cache
+from limits import Overloaded
+from tracing import (ANSWERS, METRICS_PORT, REPAIRS, SQL_CACHE, UNSAFE_SQL, span, start_metrics_server,
+                     trace)
 
+ANSWER_TIMINGS = os.getenv("ANSWER_TIMINGS", "0") == "1"
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+
+@span("repair")
 def repair_once(question: str, cards, bad_sql: str, error_msg: str) -> str:
     reprompt = build_prompt(question, cards) + \
         f"\nThe previous SQL produced an error:\n{error_msg}\n" \
@@ -10,24 +27,168 @@ def repair_once(question: str, cards, bad_sql: str, error_msg: str) -> str:
     resp = call_ollama(reprompt)
     return extract_sql(resp)
 
-def answer(question: str) -> Dict:
+@span("execute")
+def _execute(sql: str, pf: Optional[Dict] = None, on_preview: Optional[Callable] = None) -> Dict:
+    guard = validate(sql)
+    if RESULT_CACHE and guard.ok:
+        with span("result_cache") as rec:
+            versions = result_cache.versions()  # before the query runs, so a racing load invalidates it
+            hit = result_cache.get(guard)
+            rec["hit"] = hit is not None
+        if hit:
+            cols = hit.pop("columns")
+            if on_preview:
+                on_preview(cols, hit["preview"])
+            return {**hit, "result_cache": "hit"}
+    with span("rollup_rewrite") as rec:
+        rw = rewrite_to_rollup(guard) if ROLLUP_REWRITE else None
+        rec["rollup"] = rw["rollup"] if rw else None
+    with span("preflight"):
+        if rw:
+            pf = preflight(rw["sql"])
+        pf = pf or preflight(sql)
+    res = run_sql_stream(pf["sql"], on_preview=on_preview)
+    out = {"sql": pf["sql"], "rows": res["rows"], "preview": res["preview"], "plan": pf["plan"]}
+    if rw:
+        out["rollup"] = rw["rollup"]
+    if pf["limit_injected"]:
+        out["limit_injected"] = True
+    if res["truncated"]:
+        out["truncated"] = True
+    if RESULT_CACHE and guard.ok:
+        result_cache.put(guard, out, res["columns"], versions)
+    return out
+
+def _schema_retry(sql: str, on_sql: Callable[[str], None], on_preview: Optional[Callable],
+                  literals_only: bool = False) -> Optional[Tuple[str, Dict]]:
+    """Re-run `sql` after a catalog-driven fix (repair.schema_repair): (fixed SQL, result), or None
+    if there was nothing to fix or the fixed query failed too, so the caller falls back to the LLM."""
+    if not SCHEMA_REPAIR:
+        return None
+    with span("repair.schema") as rec:
+        fix = schema_repair(sql, literals_only=literals_only)
+        rec["fixes"] = fix["fixes"] if fix else []
+    if not fix:
+        return None
+    try:
+        on_sql(fix["sql"])
+        return fix["sql"], {**_execute(fix["sql"], on_preview=on_preview), "fixes": fix["fixes"]}
+    except Overloaded:
+        raise
+    except Exception:
+        return None
+
+def _empty(out: Dict) -> bool:
+    """No rows, or a lone all-NULL aggregate row: what a misspelled sensor tag or machine name gives."""
+    return out["rows"] == 0 or (out["rows"] == 1 and all(v is None for v in out["preview"][0].values()))
+
+def _outcome(res: Dict) -> str:
+    if "error" in res:
+        return res["error"]
+    return "repaired" if res.get("repaired") else "cache-hit" if res.get("cache") == "hit" else "ok"
+
+def answer(question: str, timings: bool = ANSWER_TIMINGS, qvec: Optional[np.ndarray] = None,
+           on_sql: Optional[Callable[[str], None]] = None,
+           on_preview: Optional[Callable[[List[str], List[Dict]], None]] = None) -> Dict:
+    """Question -> SQL -> result. With `timings`, the per-stage spans are returned under "timings".
+
+    `qvec` skips embedding the question; `on_sql` is called with each SQL about to be executed
+    and `on_preview` with the first rows, so callers can stream before the query finishes.
+    Raises limits.Overloaded when a backend refuses the work.
+    """
+    try:
+        with trace() as spans, span("answer") as total:
+            res = _answer(question, qvec, on_sql or (lambda sql: None), on_preview)
+    except Overloaded:
+        ANSWERS.inc(outcome="overloaded")
+        raise
+    outcome = _outcome(res)
+    ANSWERS.inc(outcome=outcome)
+    if res.get("cache"):
+        SQL_CACHE.inc(result=res["cache"])
+    if "orig_sql" in res:
+        REPAIRS.inc(result="ok" if res.get("repaired") else "failed", path=res.get("repair", "llm"))
+    if outcome in ("unsafe-sql", "unsafe-sql-repair"):
+        UNSAFE_SQL.inc()
+    if timings:
+        res["timings"] = {"total_ms": total["ms"], "spans": spans[1:]}
+    return res
+
+def _answer(question: str, qvec: Optional[np.ndarray], on_sql: Callable[[str], None],
+            on_preview: Optional[Callable]) -> Dict:
+    if qvec is None:
+        with span("embed"):
+            qvec = embed_queries([question])[0]
+    with span("sql_cache"):
+        hit = sql_cache.get(qvec, question)
+    if hit:
+        try:
+            on_sql(hit["sql"])
+            return {**_execute(hit["sql"], on_preview=on_preview), "cache": "hit", "cached_question": hit["question"]}
+        except Overloaded:
+            raise
+        except Exception:
+            sql_cache.discard(hit["question"])
+
     cards = retrieve_cards(question, k=10)
-    prompt = build_prompt(question, cards)
-    resp = call_ollama(prompt)
-    sql = extract_sql(resp)
+    extra, pf = {"cache": "miss"}, None
+    if SQL_CANDIDATES > 1:
+        with span("candidates"):
+            race = generate_sql(question, cards)
+        sql, pf = race["sql"], race.get("preflight")
+        extra["candidates"] = {"n": race["candidates"], "winner": race.get("candidate"),
+                               "rejected": len(race["rejected"])}
+        if "prompt_tokens" in race:  # the winning (or repaired) candidate's prompt
+            extra["prompt_tokens"] = race["prompt_tokens"]
+        if race.get("error") == "no-candidate":  # timeouts or Ollama errors, not a guard rejection
+            return {"error": "no-candidate", "sql": "",
+                    "exception": ", ".join(r["error"] for r in race["rejected"]), **extra}
+    else:
+        with span("prompt") as rec:
+            p = assemble_prompt(question, cards)
+            rec.update(tokens=p["tokens"], cards=len(p["cards"]), dropped=p["dropped"])
+        extra["prompt_tokens"] = p["tokens"]
+        resp = call_ollama(p["prompt"])
+        sql = extract_sql(resp)
 
-    if not is_safe(sql):
-        return {"error":"unsafe-sql", "sql": sql}
+    with span("guard"):
+        safe = is_safe(sql)
+    if not safe:
+        return {"error":"unsafe-sql", "sql": sql, **extra}
 
     try:
-        df = run_sql(sql)
-        return {"sql": sql, "rows": len(df), "preview": df.head(10).to_dict(orient="records")}
+        on_sql(sql)
+        out = _execute(sql, pf, on_preview)
+        # the semantic cache keeps the guarded SQL: rollup rewrites and LIMITs are redone per run,
+        # so a cached query still falls back to raw telemetry when the rollups lag
+        retry = _schema_retry(sql, on_sql, on_preview, literals_only=True) if _empty(out) else None
+        if retry and not _empty(retry[1]):
+            sql_cache.put(question, qvec, retry[0])
+            return {**retry[1], "orig_sql": sql, "repaired": True, "repair": "schema", **extra}
+        sql_cache.put(question, qvec, sql)
+        return {**out, **extra}
+    except Overloaded:
+        raise
+    except PreflightError as e:
+        return {"error":"too-expensive", "sql": sql, "plan": e.plan, "exception": str(e), **extra}
     except Exception as e:
+        retry = _schema_retry(sql, on_sql, on_preview)
+        if retry:
+            sql_cache.put(question, qvec, retry[0])
+            return {**retry[1], "orig_sql": sql, "repaired": True, "repair": "schema", **extra}
         repaired = repair_once(question, cards, sql, str(e))
-        if not is_safe(repaired):
-            return {"error":"unsafe-sql-repair", "sql": repaired, "orig_sql": sql, "exception": str(e)}
+        with span("guard"):
+            safe = is_safe(repaired)
+        if not safe:
+            return {"error":"unsafe-sql-repair", "sql": repaired, "orig_sql": sql, "exception": str(e), **extra}
         try:
-            df = run_sql(repaired)
-            return {"sql": repaired, "orig_sql": sql, "rows": len(df), "preview": df.head(10).to_dict(orient="records"), "repaired": True}
+            on_sql(repaired)
+            out = _execute(repaired, on_preview=on_preview)
+            sql_cache.put(question, qvec, repaired)
+            return {**out, "orig_sql": sql, "repaired": True, "repair": "llm", **extra}
+        except Overloaded:
+            raise
+        except PreflightError as e2:
+            return {"error":"too-expensive", "sql": repaired, "orig_sql": sql, "plan": e2.plan, "exception": str(e2), **extra}
         except Exception as e2:
-            return {"error":"repair-failed", "sql": repaired, "orig_sql": sql, "exception": str(e2)}
+            return {"error":"repair-failed", "sql": repaired, "orig_sql": sql, "exception": str(e2), **extra}
@@ -0,0 +1,138 @@
+import os, json, time, argparse, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List
+
+# report order; spans are nested (repair contains its own llm call, execute contains db.query)
+STAGES = ["embed", "sql_cache", "retrieve", "prompt", "llm.queue", "llm", "llm.first_token", "candidates", "guard",
+          "execute", "result_cache", "rollup_rewrite", "preflight", "db.explain", "db.query", "repair.schema", "repair"]
+
+def stage_times(spans) -> Dict[str, List[float]]:
+    out: Dict[str, List[float]] = {}
+    for s in spans:
+        out.setdefault(s["stage"], []).append(s["ms"] / 1000)
+        if s["stage"] == "llm" and "first_token_s" in s:
+            out.setdefault("llm.first_token", []).append(s["first_token_s"])
+    return out
+
+def default_questions() -> List[str]:
+    from fake_ollama import example_pairs
+    return [q for q, _ in example_pairs()]
+
+def load_questions(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def summarize(values: List[float], wall: float) -> Dict:
+    a = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(a, [50, 95, 99]) if len(a) else (0.0, 0.0, 0.0)
+    return {"n": len(a), "p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2), "mean_ms": round(float(a.mean()), 2) if len(a) else 0.0,
+            "per_s": round(len(a) / wall, 2) if wall else 0.0}
+
+def use_memory_qdrant(llm) -> None:
+    """Serve retrieval from an in-process Qdrant filled from the local snapshot."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, VectorParams, PointStruct
+    from local_index import INDEX_DIR, LocalIndex
+    idx = LocalIndex(INDEX_DIR)
+    client = QdrantClient(":memory:")
+    client.create_collection(llm.COLL, vectors_config=VectorParams(size=idx.vecs.shape[1], distance=Distance.COSINE))
+    client.upsert(llm.COLL, points=[PointStruct(id=i, vector=v.tolist(), payload=p)
+                                    for i, (v, p) in enumerate(zip(idx.vecs, idx.payloads))])
+    llm._qdrant, llm.RETRIEVER_BACKEND = client, "qdrant"
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    lines = []
+    for stage, s in report["stages"].items():
+        b = baseline.get("stages", {}).get(stage)
+        if b and b["p95_ms"]:
+            lines.append(f"{stage:15s} p95 {b['p95_ms']:9.1f} -> {s['p95_ms']:9.1f} ms ({s['p95_ms'] / b['p95_ms'] - 1:+.0%})")
+    return lines
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end latency benchmark of app.answer, per pipeline stage.")
+    ap.add_argument("--questions", help="text file (one per line) or JSON list; default: the example card questions")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=3, help="passes over the question set")
+    ap.add_argument("--warmup", type=int, default=1, help="unmeasured questions run first")
+    ap.add_argument("--retriever", choices=["local", "memory", "qdrant"], default="local",
+                    help="local snapshot, in-memory Qdrant built from it, or the QDRANT_URL server")
+    ap.add_argument("--fake-ollama", action="store_true", help="start the offline Ollama stand-in")
+    ap.add_argument("--llm-delay", type=float, default=0.5, help="fake Ollama: seconds before the first token")
+    ap.add_argument("--token-delay", type=float, default=0.01, help="fake Ollama: seconds between tokens")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fake Ollama: share of answers that need repair")
+    ap.add_argument("--sql-cache", action="store_true", help="leave the semantic SQL cache on (off by default)")
+    ap.add_argument("--result-cache", action="store_true", help="leave the query result cache on (off by default)")
+    ap.add_argument("--out", help="write the JSON report here")
+    ap.add_argument("--baseline", help="earlier JSON report to compare p95 against")
+    args = ap.parse_args()
+
+    if args.fake_ollama:
+        from fake_ollama import FakeOllama
+        server = FakeOllama(delay=args.llm_delay, token_delay=args.token_delay, fail_rate=args.fail_rate).serve()
+        os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.retriever == "local":
+        os.environ["RETRIEVER_BACKEND"] = "local"
+    import app, executor, llm  # after the environment is set, so module-level clients pick it up
+    from sql_cache import sql_cache
+    if args.retriever == "memory":
+        use_memory_qdrant(llm)
+    if not args.sql_cache:
+        sql_cache.threshold = 2.0  # cosine never exceeds 1: every lookup misses
+    if not args.result_cache:
+        app.RESULT_CACHE = False
+    executor.warmup()
+
+    questions = load_questions(args.questions) if args.questions else default_questions()
+    for q in questions[:args.warmup]:
+        app.answer(q)
+    runs = questions * args.repeat
+
+    def one(q: str) -> Dict:
+        t0 = time.perf_counter()
+        try:
+            res = app.answer(q, timings=True)
+        except Exception as e:
+            res = {"error": f"exception: {type(e).__name__}"}
+        spans = res.get("timings", {}).get("spans", [])
+        return {"question": q, "total": time.perf_counter() - t0, "stages": stage_times(spans),
+                "outcome": app._outcome(res)}
+
+    started, t0 = datetime.now(timezone.utc), time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        records = list(pool.map(one, runs))
+    wall = time.perf_counter() - t0
+
+    per_stage: Dict[str, List[float]] = {}
+    outcomes: Dict[str, int] = {}
+    for r in records:
+        for stage, ds in r["stages"].items():
+            per_stage.setdefault(stage, []).extend(ds)
+        outcomes[r["outcome"]] = outcomes.get(r["outcome"], 0) + 1
+    order = STAGES + sorted(set(per_stage) - set(STAGES))
+    report = {
+        "started_at": started.isoformat(timespec="seconds"),
+        "config": {**{k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+                   "questions": len(questions), "requests": len(runs)},
+        "wall_s": round(wall, 3), "throughput_qps": round(len(runs) / wall, 3),
+        "total": summarize([r["total"] for r in records], wall),
+        "stages": {s: summarize(per_stage[s], wall) for s in order if s in per_stage},
+        "outcomes": outcomes,
+    }
+    print(f"{len(runs)} questions in {wall:.1f}s at concurrency {args.concurrency} "
+          f"({report['throughput_qps']} q/s); outcomes {outcomes}")
+    for name, s in [("total", report["total"])] + list(report["stages"].items()):
+        print(f"{name:15s} n={s['n']:4d} p50 {s['p50_ms']:9.1f}  p95 {s['p95_ms']:9.1f}  p99 {s['p99_ms']:9.1f} ms")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    return report
+
+if __name__ == "__main__":
+    main()
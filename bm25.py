@@ -0,0 +1,103 @@
+import os, re, json, threading, numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from local_index import INDEX_DIR
+
+BM25_FILE = "bm25.npz"
+BM25_VOCAB_FILE = "bm25_vocab.json"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+# identifiers such as bed_height_mm, Cr2O3, Jig-1, m3/h stay whole; their parts are indexed as well
+TOKEN = re.compile(r"[a-z0-9]+(?:[_\-/.][a-z0-9]+)*")
+PART = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    out = []
+    for tok in TOKEN.findall(text.lower()):
+        out.append(tok)
+        parts = PART.findall(tok)
+        if len(parts) > 1:
+            out += parts
+    return out
+
+def write_bm25(docs: List[Dict], path: str = INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B) -> None:
+    """Precompute per-(term, card) BM25 weights as a term-major CSR posting matrix.
+
+    Stored as plain arrays (npz) plus a JSON vocabulary; nothing is pickled.
+    """
+    tfs = [Counter(tokenize(d["text"])) for d in docs]
+    lens = np.array([sum(tf.values()) for tf in tfs], dtype=np.float32)
+    avgdl = float(lens.mean()) if len(docs) else 1.0
+    vocab: Dict[str, int] = {}
+    postings: List[List[Tuple[int, int]]] = []
+    for j, tf in enumerate(tfs):
+        for term, n in tf.items():
+            t = vocab.setdefault(term, len(vocab))
+            if t == len(postings):
+                postings.append([])
+            postings[t].append((j, n))
+    indptr, indices, data = [0], [], []
+    for plist in postings:
+        docs_t = np.array([j for j, _ in plist], dtype=np.int32)
+        tf_t = np.array([n for _, n in plist], dtype=np.float32)
+        idf = np.log(1 + (len(docs) - len(plist) + 0.5) / (len(plist) + 0.5))
+        norm = k1 * (1 - b + b * lens[docs_t] / avgdl)
+        indices.append(docs_t)
+        data.append((idf * tf_t * (k1 + 1) / (tf_t + norm)).astype(np.float32))
+        indptr.append(indptr[-1] + len(plist))
+    os.makedirs(path, exist_ok=True)
+    npz, voc = os.path.join(path, BM25_FILE), os.path.join(path, BM25_VOCAB_FILE)
+    with open(voc + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"terms": list(vocab), "ids": [d.get("id") for d in docs], "k1": k1, "b": b}, f, ensure_ascii=False)
+    with open(npz + ".tmp", "wb") as f:
+        np.savez(f, indptr=np.array(indptr, dtype=np.int64),
+                 indices=np.concatenate(indices) if indices else np.zeros(0, np.int32),
+                 data=np.concatenate(data) if data else np.zeros(0, np.float32))
+    os.replace(voc + ".tmp", voc)
+    os.replace(npz + ".tmp", npz)
+
+class BM25Index:
+    """Sparse BM25 over the card snapshot; a query sums the precomputed weights of its terms."""
+
+    def __init__(self, path: str = INDEX_DIR):
+        self.path = path
+        npz = os.path.join(path, BM25_FILE)
+        self.mtime = os.stat(npz).st_mtime_ns
+        with open(os.path.join(path, BM25_VOCAB_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.vocab = {t: i for i, t in enumerate(meta["terms"])}
+        self.ids: List[Optional[str]] = meta["ids"]
+        with np.load(npz) as z:
+            self.indptr, self.indices, self.data = z["indptr"], z["indices"], z["data"]
+
+    def scores(self, query: str) -> np.ndarray:
+        terms = [self.vocab[t] for t in tokenize(query) if t in self.vocab]
+        if not terms:
+            return np.zeros(len(self.ids), dtype=np.float32)
+        spans = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in terms]
+        pos = np.concatenate(spans)
+        return np.bincount(self.indices[pos], weights=self.data[pos], minlength=len(self.ids)).astype(np.float32)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (position in the snapshot, score), zero scores dropped."""
+        s = self.scores(query)
+        k = min(k, int(np.count_nonzero(s)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-s, k - 1)[:k]
+        top = top[np.argsort(-s[top])]
+        return [(int(i), float(s[i])) for i in top]
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+def get_bm25_index(path: str = INDEX_DIR) -> BM25Index:
+    """Shared BM25Index, reloaded when build_index has written a new one."""
+    global _index
+    mtime = os.stat(os.path.join(path, BM25_FILE)).st_mtime_ns
+    if _index is None or _index.path != path or _index.mtime != mtime:
+        with _index_lock:
+            if _index is None or _index.path != path or _index.mtime != mtime:
+                _index = BM25Index(path)
+    return _index
@@ -0,0 +1,99 @@
+import os, atexit, asyncio, threading
+from typing import Dict, List, Optional
+from llm import assemble_prompt, call_ollama_async, extract_sql
+from sqlguard import is_safe
+from preflight import PreflightError, preflight_async
+from limits import Overloaded
+from ollama_client import ollama
+from tracing import span
+
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))
+SQL_CANDIDATE_TIMEOUT = float(os.getenv("SQL_CANDIDATE_TIMEOUT", "90"))
+SQL_CANDIDATE_TEMPERATURES = [float(t) for t in os.getenv("SQL_CANDIDATE_TEMPERATURES", "0,0.4,0.8").split(",")]
+
+def candidate_variants(cards: List[Dict], n: int) -> List[Dict]:
+    """Candidate i cycles through the temperatures; every other full cycle keeps only the
+    top half of the retrieved cards so candidates also differ in context."""
+    temps = SQL_CANDIDATE_TEMPERATURES
+    out = []
+    for i in range(n):
+        subset = cards if (i // len(temps)) % 2 == 0 else cards[:max(1, len(cards) // 2)]
+        out.append({"options": {"temperature": temps[i % len(temps)], "seed": i}, "cards": subset})
+    return out
+
+async def _candidate(i: int, question: str, variant: Dict) -> Dict:
+    with span("prompt", candidate=i) as rec:
+        p = assemble_prompt(question, variant["cards"])
+        rec.update(tokens=p["tokens"], cards=len(p["cards"]), dropped=p["dropped"])
+    resp = await call_ollama_async(p["prompt"], options=variant["options"])
+    sql = extract_sql(resp)
+    base = {"candidate": i, "sql": sql, "prompt_tokens": p["tokens"]}
+    if not is_safe(sql):
+        return {**base, "ok": False, "error": "unsafe-sql"}
+    try:
+        pf = await preflight_async(sql)
+    except PreflightError as e:
+        return {**base, "ok": False, "error": "too-expensive", "exception": str(e)}
+    except Exception as e:
+        return {**base, "ok": False, "error": "explain-failed", "exception": str(e)}
+    return {**base, "ok": True, "preflight": pf}
+
+async def race_candidates(question: str, cards: List[Dict], n: int = SQL_CANDIDATES,
+                          timeout: float = SQL_CANDIDATE_TIMEOUT) -> Dict:
+    """Generate `n` SQL candidates concurrently; the first that passes is_safe and the
+    EXPLAIN preflight wins and the others are cancelled. Without a winner, the best rejected candidate is
+    returned (a safe one that failed EXPLAIN first) so the caller can still repair it; if none produced
+    any SQL (timeouts, Ollama errors) the result has "error": "no-candidate" and an empty "sql"."""
+    tasks = [asyncio.create_task(_candidate(i, question, v)) for i, v in enumerate(candidate_variants(cards, n))]
+    rejected = []
+    try:
+        for fut in asyncio.as_completed(tasks, timeout=timeout):
+            try:
+                res = await fut
+            except Overloaded as e:  # a TimeoutError subclass, so it has to be caught first
+                rejected.append({"ok": False, "error": "overloaded", "exception": str(e)})
+                continue
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                rejected.append({"ok": False, "error": "generation-failed", "exception": str(e)})
+                continue
+            if res["ok"]:
+                return {**res, "candidates": n, "rejected": rejected}
+            rejected.append(res)
+    except asyncio.TimeoutError:
+        rejected.append({"ok": False, "error": "timeout"})
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if rejected and all(r["error"] == "overloaded" for r in rejected):
+        raise Overloaded("ollama", "every candidate was refused")
+    with_sql = [r for r in rejected if r.get("sql")]
+    if not with_sql:
+        return {"ok": False, "sql": "", "error": "no-candidate", "candidates": n, "rejected": rejected}
+    best = next((r for r in with_sql if r["error"] == "explain-failed"), with_sql[0])
+    return {"ok": False, "sql": best["sql"], "prompt_tokens": best["prompt_tokens"], "candidates": n, "rejected": rejected}
+
+# every race runs on one long-lived loop, so Ollama's async client (one per loop) and its
+# connections are reused across questions instead of being rebuilt and leaked per asyncio.run
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _race_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="candidates", daemon=True).start()
+            atexit.register(_close_loop, _loop)
+        return _loop
+
+def _close_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.run_coroutine_threadsafe(ollama.aclose(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+
+def generate_sql(question: str, cards: List[Dict], n: int = SQL_CANDIDATES,
+                 timeout: float = SQL_CANDIDATE_TIMEOUT) -> Dict:
+    """Blocking race_candidates for the worker threads; trace spans carry over to the loop."""
+    return asyncio.run_coroutine_threadsafe(race_candidates(question, cards, n, timeout), _race_loop()).result()
@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine, text
-from typing import List, Dict
+from typing import List, Dict, Optional
+from catalog import load_catalog
 
 def make_table_cards() -> List[Dict]:
     return [
@@ -8,9 +8,17 @@ def make_table_cards() -> List[Dict]:
         {"type":"table","table":"sensors",
          "text":"TABLE sensors: sensors per machine; PK sensor_id; JOIN sensors.machine_id -> machines.machine_id."},
         {"type":"table","table":"telemetry",
-         "text":"TABLE telemetry: minute-level values; PK (ts, sensor_id); value is numeric reading; JOIN telemetry.sensor_id -> sensors.sensor_id."},
+         "text":"TABLE telemetry: minute-level values, partitioned by day on ts; PK (sensor_id, ts); value is numeric reading; JOIN telemetry.sensor_id -> sensors.sensor_id. Always filter ts to a time window."},
         {"type":"table","table":"lab_samples",
          "text":"TABLE lab_samples: lab QC (tailings Cr2O3 %); PK sample_id; time ts; JOIN lab_samples.machine_id -> machines.machine_id."},
+        {"type":"table","table":"telemetry_hourly",
+         "text":"TABLE telemetry_hourly: hourly rollup of telemetry per sensor; PK (sensor_id, bucket); bucket = hour start (UTC); "
+                "n = readings, value_sum, value_min, value_max; average = SUM(value_sum)/SUM(n); "
+                "JOIN telemetry_hourly.sensor_id -> sensors.sensor_id. Prefer for hourly/daily aggregates over many days."},
+        {"type":"table","table":"telemetry_daily",
+         "text":"TABLE telemetry_daily: daily rollup of telemetry per sensor; PK (sensor_id, bucket); bucket = day start (UTC); "
+                "n, value_sum, value_min, value_max; average = SUM(value_sum)/SUM(n); "
+                "JOIN telemetry_daily.sensor_id -> sensors.sensor_id. Prefer for daily/weekly/monthly aggregates."},
     ]
 
 SYNONYMS = {
@@ -24,21 +32,41 @@ SYNONYMS = {
     ("sensors","clayness_index"): ["clay","muddiness","clay index"],
 }
 
-def make_column_cards(db_url:str) -> List[Dict]:
-    eng = create_engine(db_url)
+SKIP_TABLES = {"rollup_watermarks", "data_versions"}  # bookkeeping, never queried by users
+
+def make_column_cards(db_url:str, catalog:Optional[Dict]=None) -> List[Dict]:
+    cat = catalog or load_catalog(db_url)
+    out=[]
+    for t, info in sorted(cat["tables"].items()):
+        if t in SKIP_TABLES:
+            continue
+        pk = set(info["primary_key"])
+        fks = {fk["column"]: f"{fk['ref_table']}.{fk['ref_column']}" for fk in info["foreign_keys"]}
+        for c in info["columns"]:
+            col = c["name"]
+            keys = (["PK"] if col in pk else []) + ([f"FK -> {fks[col]}"] if col in fks else [])
+            syn = SYNONYMS.get((t, col), [])
+            s = f"Column {t}.{col} ({', '.join([c['type']] + keys)}). Synonyms: {', '.join(syn) if syn else '—'}"
+            out.append({"type":"column","table":t,"column":col,"text":s})
+    return out
+
+def make_value_cards(db_url:str, catalog:Optional[Dict]=None) -> List[Dict]:
+    """Real domain values, so the model filters on tags and machine names that exist."""
+    cat = catalog or load_catalog(db_url)
     out=[]
-    with eng.begin() as con:
-        tables = ["machines","sensors","telemetry","lab_samples"]
-        for t in tables:
-            rows = con.execute(text("""
-                SELECT column_name, data_type
-                FROM information_schema.columns
-                WHERE table_name=:t ORDER BY ordinal_position
-            """), {"t": t}).fetchall()
-            for col, dtype in rows:
-                syn = SYNONYMS.get((t, col), [])
-                s = f"Column {t}.{col} ({dtype}). Synonyms: {', '.join(syn) if syn else '—'}"
-                out.append({"type":"column","table":t,"column":col,"text":s})
+    for name, unit, desc, n in cat["values"]["sensors"]:
+        syn = SYNONYMS.get(("sensors", name), [])
+        s = (f"Sensor tag sensors.name = '{name}'" + (f" (unit {unit})" if unit else "") +
+             (f": {desc}" if desc else "") + f". Present on {n} machine(s). Synonyms: {', '.join(syn) if syn else '—'}")
+        out.append({"type":"value","table":"sensors","column":"name","value":name,"text":s})
+    areas: Dict[str, List[str]] = {}
+    for name, area in cat["values"]["machines"]:
+        areas.setdefault(area or "", []).append(name)
+    for area, names in sorted(areas.items()):
+        listed = ", ".join(f"'{m}'" for m in names)
+        s = (f"Machines in area machines.area = '{area}': machines.name in ({listed})" if area
+             else f"Machines without an area: machines.name in ({listed})")
+        out.append({"type":"value","table":"machines","column":"area","value":area,"text":s})
     return out
 
 def make_example_cards() -> List[Dict]:
@@ -243,6 +271,24 @@ def make_example_cards() -> List[Dict]:
             "AND m.name IN ('Jig-1', 'Jig-2') "
             "AND t.ts >= CURRENT_TIMESTAMP - INTERVAL '7 days';"
          },
+         {"type":"example","text":
+            "Q: daily average bed height for Jig-1 over the last 30 days\n"
+            "SQL: SELECT d.bucket::date AS day, SUM(d.value_sum) / SUM(d.n) AS avg_bed_height_mm "
+            "FROM telemetry_daily d JOIN sensors s ON d.sensor_id=s.sensor_id "
+            "JOIN machines m ON s.machine_id=m.machine_id "
+            "WHERE s.name='bed_height_mm' AND m.name='Jig-1' "
+            "AND d.bucket >= CURRENT_DATE - INTERVAL '30 days' "
+            "GROUP BY 1 ORDER BY 1;"
+         },
+         {"type":"example","text":
+            "Q: hourly maximum water flow per machine over the last 2 weeks\n"
+            "SQL: SELECT m.name, h.bucket AS hour, MAX(h.value_max) AS max_water_m3h "
+            "FROM telemetry_hourly h JOIN sensors s ON h.sensor_id=s.sensor_id "
+            "JOIN machines m ON s.machine_id=m.machine_id "
+            "WHERE s.name='water_flow_m3h' "
+            "AND h.bucket >= date_trunc('hour', CURRENT_TIMESTAMP) - INTERVAL '14 days' "
+            "GROUP BY m.name, h.bucket ORDER BY m.name, h.bucket;"
+         },
          {"type":"example","text":
             "Q: list plant areas where the average tailings Cr2O3 percentage was above 0.3 this month\n"
             "SQL: SELECT m.area, AVG(l.tailings_cr2o3_pct) AS avg_cr_pct "
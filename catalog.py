@@ -0,0 +1,105 @@
+import os, json
+from typing import Dict, Optional
+from sqlalchemy import text
+from executor import get_engine
+from local_index import INDEX_DIR
+
+CATALOG_FILE = os.path.join(INDEX_DIR, "catalog.json")
+VALUE_SAMPLE_LIMIT = int(os.getenv("CATALOG_VALUE_LIMIT", "200"))  # distinct values kept per column
+
+def _over(join: str) -> str:
+    """Public base tables and partitioned parents; partitions (and what is cloned onto them) are skipped."""
+    return (f"FROM pg_class c JOIN pg_namespace ns ON ns.oid = c.relnamespace {join} "
+            "WHERE ns.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition")
+
+_COLS = "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped"
+
+# Cheap to compute: changes whenever a column, constraint or index changes, or any machine/sensor row
+# the value cards are built from (name, unit, description, area) is added, renamed or edited.
+FINGERPRINT_SQL = f"""
+SELECT md5(concat_ws('|',
+  (SELECT string_agg(c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod), ',' ORDER BY c.relname, a.attnum)
+   {_over(_COLS)}),
+  (SELECT string_agg(k.conname || ':' || pg_get_constraintdef(k.oid), ',' ORDER BY k.conname)
+   {_over("JOIN pg_constraint k ON k.conrelid = c.oid")}),
+  (SELECT string_agg(i.indexrelid::regclass::text, ',' ORDER BY i.indexrelid::regclass::text)
+   {_over("JOIN pg_index i ON i.indrelid = c.oid")}),
+  (SELECT md5(string_agg(concat_ws(':', sensor_id, machine_id, name, unit, description), ',' ORDER BY sensor_id))
+   FROM sensors),
+  (SELECT md5(string_agg(concat_ws(':', machine_id, name, area), ',' ORDER BY machine_id)) FROM machines)))
+"""
+
+CATALOG_SQL = f"""
+SELECT json_build_object(
+  'columns', (SELECT json_agg(json_build_array(c.relname, a.attname, format_type(a.atttypid, a.atttypmod), a.attnotnull)
+                              ORDER BY c.relname, a.attnum)
+              {_over(_COLS)}),
+  'primary_keys', (SELECT json_agg(json_build_array(c.relname, a.attname) ORDER BY c.relname, u.ord)
+                   {_over("JOIN pg_constraint k ON k.conrelid = c.oid AND k.contype = 'p' "
+                          "CROSS JOIN LATERAL unnest(k.conkey) WITH ORDINALITY u(attnum, ord) "
+                          "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = u.attnum")}),
+  'foreign_keys', (SELECT json_agg(json_build_array(c.relname, a.attname, r.relname, ra.attname) ORDER BY c.relname, u.ord)
+                   {_over("JOIN pg_constraint k ON k.conrelid = c.oid AND k.contype = 'f' "
+                          "CROSS JOIN LATERAL unnest(k.conkey, k.confkey) WITH ORDINALITY u(attnum, fattnum, ord) "
+                          "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = u.attnum "
+                          "JOIN pg_class r ON r.oid = k.confrelid "
+                          "JOIN pg_attribute ra ON ra.attrelid = r.oid AND ra.attnum = u.fattnum")}),
+  'indexes', (SELECT json_agg(json_build_array(c.relname, pg_get_indexdef(i.indexrelid)) ORDER BY c.relname, pg_get_indexdef(i.indexrelid))
+              {_over("JOIN pg_index i ON i.indrelid = c.oid")})
+)
+"""
+
+VALUE_SQL = {
+    "sensors": """SELECT name, unit, description, count(DISTINCT machine_id) FROM sensors
+                  GROUP BY 1, 2, 3 ORDER BY 1 LIMIT :n""",
+    "machines": "SELECT name, area FROM machines ORDER BY machine_id LIMIT :n",
+}
+
+def _introspect(con, fingerprint: str) -> Dict:
+    raw = con.execute(text(CATALOG_SQL)).scalar()
+    tables: Dict[str, Dict] = {}
+    for t, col, dtype, notnull in raw["columns"] or []:
+        tables.setdefault(t, {"columns": [], "primary_key": [], "foreign_keys": [], "indexes": []})
+        tables[t]["columns"].append({"name": col, "type": dtype, "not_null": notnull})
+    for t, col in raw["primary_keys"] or []:
+        tables[t]["primary_key"].append(col)
+    for t, col, rt, rcol in raw["foreign_keys"] or []:
+        tables[t]["foreign_keys"].append({"column": col, "ref_table": rt, "ref_column": rcol})
+    for t, idx in raw["indexes"] or []:
+        tables[t]["indexes"].append(idx)
+    values = {k: [list(r) for r in con.execute(text(q), {"n": VALUE_SAMPLE_LIMIT})] for k, q in VALUE_SQL.items()}
+    return {"fingerprint": fingerprint, "tables": tables, "values": values}
+
+def cached_catalog(path: str = CATALOG_FILE) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def load_catalog(db_url: Optional[str] = None, path: str = CATALOG_FILE, refresh: bool = False) -> Dict:
+    """Tables, keys, indexes and sampled domain values; re-introspected only when the fingerprint moves."""
+    with get_engine(db_url).connect() as con:
+        fingerprint = con.execute(text(FINGERPRINT_SQL)).scalar()
+        cat = None if refresh else cached_catalog(path)
+        if cat is not None and cat.get("fingerprint") == fingerprint:
+            return cat
+        cat = _introspect(con, fingerprint)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(cat, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+    return cat
+
+_shared = {"mtime": None, "catalog": None}
+
+def get_catalog() -> Dict:
+    """catalog.json as written by build_index (reloaded when it changes), else introspected once."""
+    try:
+        mtime = os.stat(CATALOG_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if _shared["catalog"] is None or mtime != _shared["mtime"]:
+        _shared["catalog"] = cached_catalog() if mtime else load_catalog()
+        _shared["mtime"] = mtime
+    return _shared["catalog"]
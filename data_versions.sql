@@ -0,0 +1,22 @@
+-- One version counter per table, bumped by statement-level triggers inside the writing transaction,
+-- so a load is visible to the result cache exactly when its rows are. Statement triggers on the
+-- partitioned telemetry parent do not fire for writes aimed at a partition directly.
+CREATE TABLE IF NOT EXISTS data_versions (
+  tbl TEXT PRIMARY KEY, version BIGINT NOT NULL, changed_at TIMESTAMPTZ NOT NULL
+);
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+  INSERT INTO data_versions (tbl, version, changed_at) VALUES (TG_TABLE_NAME, 1, now())
+  ON CONFLICT (tbl) DO UPDATE SET version = data_versions.version + 1, changed_at = EXCLUDED.changed_at;
+  RETURN NULL;
+END $$;
+DO $$
+DECLARE t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['machines', 'sensors', 'telemetry', 'lab_samples', 'telemetry_hourly', 'telemetry_daily'] LOOP
+    IF to_regclass(t) IS NOT NULL THEN
+      EXECUTE format('CREATE OR REPLACE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                     'FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()', t || '_data_version', t);
+    END IF;
+  END LOOP;
+END $$;
@@ -0,0 +1,88 @@
+import os, sqlite3, threading, numpy as np
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")  # sqlite file for the persistent tier; empty = memory only
+
+_model: Optional["SentenceTransformer"] = None
+_model_lock = threading.Lock()
+
+def get_embedder() -> "SentenceTransformer":
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                # imported here so the caches, build_index and the service load without the model stack
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBED_MODEL)
+    return _model
+
+def normalize_question(q: str) -> str:
+    return " ".join(q.lower().split())
+
+class EmbeddingCache:
+    """LRU of query embeddings with an optional sqlite tier that survives restarts."""
+
+    def __init__(self, size: int = EMBED_CACHE_SIZE, path: str = EMBED_CACHE_PATH, model: str = EMBED_MODEL):
+        self.size, self.model = size, model
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS query_embeddings "
+                             "(model TEXT, key TEXT, vec BLOB, PRIMARY KEY (model, key))")
+            self._db.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found, missing = {}, []
+        with self._lock:
+            for k in keys:
+                v = self._mem.get(k)
+                if v is None:
+                    missing.append(k)
+                else:
+                    self._mem.move_to_end(k)
+                    found[k] = v
+            if self._db is not None and missing:
+                marks = ",".join("?" * len(missing))
+                rows = self._db.execute(f"SELECT key, vec FROM query_embeddings WHERE model=? AND key IN ({marks})",
+                                        [self.model, *missing]).fetchall()
+                for k, blob in rows:
+                    found[k] = np.frombuffer(blob, dtype=np.float32)
+                    self._remember(k, found[k])
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for k, v in items.items():
+                self._remember(k, v)
+            if self._db is not None and items:
+                self._db.executemany("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+                                     [(self.model, k, v.tobytes()) for k, v in items.items()])
+                self._db.commit()
+
+    def _remember(self, k: str, v: np.ndarray) -> None:
+        self._mem[k] = v
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.size:
+            self._mem.popitem(last=False)
+
+_cache = EmbeddingCache()
+
+def embed_queries(questions: List[str]) -> np.ndarray:
+    """Normalized float32 embeddings, one row per question; cache misses share one forward pass."""
+    keys = [normalize_question(q) for q in questions]
+    found = _cache.get_many(dict.fromkeys(keys))
+    misses = [k for k in dict.fromkeys(keys) if k not in found]
+    if misses:
+        vecs = get_embedder().encode(misses, normalize_embeddings=True).astype(np.float32)
+        fresh = dict(zip(misses, vecs))
+        _cache.put_many(fresh)
+        found.update(fresh)
+    return np.stack([found[k] for k in keys])
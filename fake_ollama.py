@@ -0,0 +1,109 @@
+import re, json, time, random, argparse, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+from cards import make_example_cards
+
+QUESTION = re.compile(r"User question:\s*(.+)")
+WORD = re.compile(r"[a-z0-9]+")
+
+def example_pairs() -> List[Tuple[str, str]]:
+    """(question, sql) pairs from the example cards, used as canned answers."""
+    out = []
+    for c in make_example_cards():
+        q, _, sql = c["text"].partition("\nSQL: ")
+        out.append((q[len("Q: "):].strip(), sql.strip()))
+    return out
+
+def _words(s: str) -> set:
+    return set(WORD.findall(s.lower()))
+
+class FakeOllama:
+    """Answers /api/generate like Ollama: streams NDJSON whose ```sql block holds the
+    SQL of the closest example question (by word overlap)."""
+
+    def __init__(self, pairs: Optional[List[Tuple[str, str]]] = None, delay: float = 0.5,
+                 token_delay: float = 0.01, fail_rate: float = 0.0, seed: int = 0):
+        self.pairs = [(_words(q), sql) for q, sql in (pairs or example_pairs())]
+        self.delay, self.token_delay, self.fail_rate = delay, token_delay, fail_rate
+        self._rng, self._lock = random.Random(seed), threading.Lock()
+
+    def sql_for(self, prompt: str) -> str:
+        m = QUESTION.search(prompt)
+        words = _words(m.group(1) if m else prompt)
+        sql = max(self.pairs, key=lambda p: len(p[0] & words))[1]
+        with self._lock:
+            broken = self._rng.random() < self.fail_rate
+        if broken and "previous SQL produced an error" not in prompt:
+            sql = sql.replace("SELECT ", "SELECT no_such_column, ", 1)  # fails at execution -> repair
+        return sql
+
+    def tokens(self, sql: str) -> List[str]:
+        return ["Here is the query:\n", "```sql\n"] + re.findall(r"\S+\s*", sql) + ["\n```", "\nThis query ", "averages ..."]
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, obj: Dict) -> None:
+                line = (json.dumps(obj) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                prompt = body.get("prompt", "")
+                t0 = time.perf_counter()
+                time.sleep(fake.delay)  # stands in for prompt evaluation
+                prompt_eval = time.perf_counter() - t0
+                toks = fake.tokens(fake.sql_for(prompt))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    t1 = time.perf_counter()
+                    for tok in toks:
+                        time.sleep(fake.token_delay)
+                        self._send({"model": body.get("model"), "response": tok, "done": False})
+                    self._send({"model": body.get("model"), "response": "", "done": True,
+                                "prompt_eval_count": len(prompt) // 4, "prompt_eval_duration": int(prompt_eval * 1e9),
+                                "eval_count": len(toks), "eval_duration": int((time.perf_counter() - t1) * 1e9),
+                                "total_duration": int((time.perf_counter() - t0) * 1e9)})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client hangs up once the sql fence closes
+
+        return Handler
+
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """Start in a daemon thread; the bound port is server.server_address[1]."""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline stand-in for the Ollama /api/generate endpoint.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--delay", type=float, default=0.5, help="seconds before the first token")
+    ap.add_argument("--token-delay", type=float, default=0.01, help="seconds between tokens")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of first answers that fail to execute")
+    ap.add_argument("--responses", help="JSON list of [question, sql] pairs instead of the example cards")
+    args = ap.parse_args()
+    pairs = json.load(open(args.responses, encoding="utf-8")) if args.responses else None
+    fake = FakeOllama(pairs, args.delay, args.token_delay, args.fail_rate)
+    server = ThreadingHTTPServer((args.host, args.port), fake.handler())
+    print(f"fake ollama on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os, time, asyncio, threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List
+from tracing import METRICS, Counter
+
+class Overloaded(TimeoutError):
+    """A backend is at its concurrency limit and its queue is full (or the wait timed out)."""
+
+    def __init__(self, backend: str, reason: str):
+        super().__init__(f"{backend} overloaded ({reason})")
+        self.backend, self.reason = backend, reason
+
+REJECTIONS = Counter("nl2sql_backend_rejections_total", "Calls refused by a backend limiter.", ("backend", "reason"))
+METRICS.append(REJECTIONS)
+_limiters: List["Limiter"] = []
+
+class Limiter:
+    """At most `limit` concurrent calls into one backend, at most `queue` callers waiting, each
+    for at most `timeout` seconds. Works from threads and from event loops alike."""
+
+    def __init__(self, name: str, limit: int, queue: int, timeout: float):
+        self.name, self.limit, self.queue, self.timeout = name, limit, queue, timeout
+        self._sem = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._stats = {"in_flight": 0, "waiting": 0, "waits": 0, "wait_time_s": 0.0, "rejected": 0, "timeouts": 0}
+        _limiters.append(self)
+
+    def _bump(self, **deltas) -> None:
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def _enqueue(self) -> None:
+        with self._lock:
+            if self._stats["waiting"] >= self.queue:
+                self._stats["rejected"] += 1
+                REJECTIONS.inc(backend=self.name, reason="queue-full")
+                raise Overloaded(self.name, f"{self.limit} running, {self.queue} queued")
+            self._stats["waiting"] += 1
+
+    def _timed_out(self) -> Overloaded:
+        self._bump(waiting=-1, timeouts=1)
+        REJECTIONS.inc(backend=self.name, reason="timeout")
+        return Overloaded(self.name, f"no slot within {self.timeout:g}s")
+
+    def acquire(self) -> None:
+        if not self._sem.acquire(blocking=False):
+            self._enqueue()
+            t0 = time.perf_counter()
+            if not self._sem.acquire(timeout=self.timeout):
+                raise self._timed_out()
+            self._bump(waiting=-1, waits=1, wait_time_s=time.perf_counter() - t0)
+        self._bump(in_flight=1)
+
+    async def acquire_async(self) -> None:
+        # polls instead of parking a thread on the semaphore, so a cancelled waiter leaks nothing
+        if not self._sem.acquire(blocking=False):
+            self._enqueue()
+            t0 = time.perf_counter()
+            try:
+                while not self._sem.acquire(blocking=False):
+                    if time.perf_counter() - t0 > self.timeout:
+                        raise self._timed_out()
+                    await asyncio.sleep(0.005)
+            except asyncio.CancelledError:
+                self._bump(waiting=-1)
+                raise
+            self._bump(waiting=-1, waits=1, wait_time_s=time.perf_counter() - t0)
+        self._bump(in_flight=1)
+
+    def release(self) -> None:
+        self._bump(in_flight=-1)
+        self._sem.release()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        await self.acquire_async()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "limit": self.limit, "queue": self.queue}
+
+def limiter_from_env(name: str, limit: int, queue: int, timeout: float) -> Limiter:
+    """Defaults overridable by <NAME>_CONCURRENCY, <NAME>_QUEUE and <NAME>_QUEUE_TIMEOUT."""
+    env = name.upper()
+    return Limiter(name, int(os.getenv(f"{env}_CONCURRENCY", str(limit))), int(os.getenv(f"{env}_QUEUE", str(queue))),
+                   float(os.getenv(f"{env}_QUEUE_TIMEOUT", str(timeout))))
+
+# One local model serves one generation at a time unless OLLAMA_NUM_PARALLEL is raised on the server.
+ollama_limiter = limiter_from_env("ollama", int(os.getenv("OLLAMA_NUM_PARALLEL", "1")), 16, 60)
+qdrant_limiter = limiter_from_env("qdrant", 8, 64, 5)
+
+def limiter_stats() -> Dict[str, Dict]:
+    return {l.name: l.stats() for l in _limiters}
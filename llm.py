@@ -1,15 +1,31 @@
-import os, httpx, re
-from typing import List, Dict
+import os, re
+from typing import List, Dict, Optional, Tuple
 from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from qdrant_client.models import SearchRequest
+from embeddings import embed_queries
+from local_index import get_local_index
+from bm25 import get_bm25_index
+from ollama_client import ollama
+from tracing import LLM_TOKENS, span
+from limits import ollama_limiter, qdrant_limiter
+from cards import make_table_cards
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
 COLL = "industrial_sql_rag"
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "qdrant")  # qdrant | local
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "vector")  # vector | bm25 | hybrid
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # rrf | weighted
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.7"))  # weighted fusion: share of the vector score
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "3"))  # each side contributes k * depth candidates
+RRF_K = int(os.getenv("RRF_K", "60"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))  # whole prompt, system rules included
+PROMPT_QUOTAS = {t: int(n) for t, n in (kv.split("=") for kv in
+                 os.getenv("PROMPT_QUOTAS", "table=3,column=6,value=4,example=3").split(","))}
+PROMPT_CORE_TABLES = os.getenv("PROMPT_CORE_TABLES", "machines,sensors,telemetry,lab_samples").split(",")
 
-_embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
 _qdrant = QdrantClient(QDRANT_URL)
-SQL_BLOCK = re.compile(r"```sql(.*?)```", re.S|re.I)
+# tolerate an unterminated fence (generation cut off by num_predict)
+SQL_BLOCK = re.compile(r"```sql(.*?)(?:```|$)", re.S|re.I)
 
 SYSTEM_PROMPT = """You are a senior SQL engineer for PostgreSQL.
 Rules:
@@ -21,25 +37,128 @@ Rules:
 - Assume timestamps are stored in UTC.
 """
 
-def retrieve_cards(question: str, k: int = 8) -> List[Dict]:
-    v = _embedder.encode([question], normalize_embeddings=True)[0]
-    hits = _qdrant.search(collection_name=COLL, query_vector=v.tolist(), limit=k)
-    return [h.payload for h in hits]
+def retrieve_cards(question: str, k: int = 8, mode: Optional[str] = None) -> List[Dict]:
+    return retrieve_cards_many([question], k, mode)[0]
 
-def build_prompt(question: str, cards: List[Dict]) -> str:
-    lines = ["Context:"]
+def _vector_hits(vecs, k: int) -> List[List[Tuple[Dict, float]]]:
+    if RETRIEVER_BACKEND == "local":
+        return get_local_index().search_many(vecs, k)
+    reqs = [SearchRequest(vector=v.tolist(), limit=k, with_payload=True) for v in vecs]
+    with qdrant_limiter.slot():
+        batch = _qdrant.search_batch(collection_name=COLL, requests=reqs)
+    return [[(h.payload, h.score) for h in hits] for hits in batch]
+
+def _bm25_hits(question: str, k: int) -> List[Tuple[Dict, float]]:
+    payloads = get_local_index().payloads  # same snapshot, same order as the BM25 postings
+    return [(payloads[i], s) for i, s in get_bm25_index().search(question, k)]
+
+def fuse(vector: List[Tuple[Dict, float]], lexical: List[Tuple[Dict, float]], k: int,
+         fusion: str = HYBRID_FUSION, alpha: float = HYBRID_ALPHA) -> List[Dict]:
+    """Merge two ranked hit lists: reciprocal rank fusion, or alpha * cosine + (1 - alpha) * BM25 / max BM25."""
+    payloads, scores = {}, {}
+
+    def add(p: Dict, score: float) -> None:
+        key = p.get("id") or p["text"]
+        payloads.setdefault(key, p)
+        scores[key] = scores.get(key, 0.0) + score
+
+    if fusion == "rrf":
+        for hits in (vector, lexical):
+            for rank, (p, _) in enumerate(hits):
+                add(p, 1.0 / (RRF_K + rank + 1))
+    else:
+        top = max((s for _, s in lexical), default=0.0) or 1.0
+        for p, s in vector:
+            add(p, alpha * s)
+        for p, s in lexical:
+            add(p, (1 - alpha) * s / top)
+    return [payloads[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+def retrieve_cards_many(questions: List[str], k: int = 8, mode: Optional[str] = None) -> List[List[Dict]]:
+    if not questions:
+        return []
+    mode = mode or RETRIEVER_MODE
+    if mode == "bm25":
+        with span("retrieve", backend="bm25", k=k):
+            return [[p for p, _ in _bm25_hits(q, k)] for q in questions]
+    vecs = embed_queries(questions)
+    with span("retrieve", backend=RETRIEVER_BACKEND, mode=mode, k=k):
+        if mode != "hybrid":
+            return [[p for p, _ in hits] for hits in _vector_hits(vecs, k)]
+        depth = k * HYBRID_DEPTH
+        return [fuse(hits, _bm25_hits(q, depth), k) for q, hits in zip(questions, _vector_hits(vecs, depth))]
+
+TOKEN_PIECE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+def estimate_tokens(text: str) -> int:
+    """Rough Llama-style BPE count: a token per ~4 letters of a word, per digit run and per symbol."""
+    return sum((len(p) + 3) // 4 if p[0].isalpha() else 1 for p in TOKEN_PIECE.findall(text))
+
+# Identical for every question, so it goes first: Ollama keeps the evaluated prefix of a
+# resident model (keep_alive) and only has to process the tail of the next prompt.
+CORE_SCHEMA = [c for c in make_table_cards() if c["table"] in PROMPT_CORE_TABLES]
+PROMPT_PREFIX = "Schema:\n" + "\n".join(f"- {c['text']}" for c in CORE_SCHEMA)
+PREFIX_TOKENS = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(PROMPT_PREFIX)
+
+def assemble_prompt(question: str, cards: List[Dict], budget: int = PROMPT_TOKEN_BUDGET,
+                    quotas: Optional[Dict[str, int]] = None) -> Dict:
+    """Fixed prefix, then retrieved cards in rank order while their type quota and the token
+    budget allow, then the question. Duplicates and cards already in the prefix are skipped."""
+    quotas = PROMPT_QUOTAS if quotas is None else quotas
+    tail = f"\nWrite a single SELECT for the user question.\nUser question: {question}"
+    used = PREFIX_TOKENS + estimate_tokens(tail) + 2
+    seen = {c["text"] for c in CORE_SCHEMA}
+    taken: Dict[str, int] = {}
+    lines, kept, dropped = [], [], 0
     for c in cards:
+        if c["text"] in seen:
+            continue
+        seen.add(c["text"])
+        kind = c.get("type", "")
+        cost = estimate_tokens(c["text"]) + 2
+        if taken.get(kind, 0) >= quotas.get(kind, 0) or used + cost > budget:
+            dropped += 1
+            continue
+        taken[kind] = taken.get(kind, 0) + 1
+        used += cost
         lines.append(f"- {c['text']}")
-    lines.append("\nWrite a single SELECT for the user question.")
-    lines.append(f"User question: {question}")
-    return "\n".join(lines)
-
-def call_ollama(prompt: str, model="llama3.1") -> str:
-    data = {"model": model, "prompt": f"{SYSTEM_PROMPT}\n\n{prompt}", "stream": False}
-    
-    r = httpx.post(f"{OLLAMA_URL}/api/generate", json=data, timeout=120)
-    r.raise_for_status()
-    return r.json()["response"]
+        kept.append(c)
+    prompt = PROMPT_PREFIX + ("\n\nContext:\n" + "\n".join(lines) if lines else "") + "\n" + tail
+    return {"prompt": prompt, "tokens": used, "cards": kept, "dropped": dropped}
+
+def build_prompt(question: str, cards: List[Dict]) -> str:
+    return assemble_prompt(question, cards)["prompt"]
+
+OLLAMA_STATS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration",
+                "first_token_s", "chunks", "stopped_early")
+
+def _note_generation(rec: Dict, resp: Dict) -> None:
+    rec.update({k: resp[k] for k in OLLAMA_STATS if k in resp})
+    LLM_TOKENS.inc(resp.get("prompt_eval_count", 0), kind="prompt")
+    LLM_TOKENS.inc(resp.get("eval_count", resp.get("chunks", 0)), kind="eval")
+
+# the wait for an Ollama slot is its own "llm.queue" span, so "llm" is the generation alone
+def call_ollama(prompt: str, model=None, options=None) -> str:
+    with span("llm.queue"):
+        ollama_limiter.acquire()
+    try:
+        with span("llm") as rec:
+            resp = ollama.generate(f"{SYSTEM_PROMPT}\n\n{prompt}", model=model, options=options)
+            _note_generation(rec, resp)
+    finally:
+        ollama_limiter.release()
+    return resp["response"]
+
+async def call_ollama_async(prompt: str, model=None, options=None) -> str:
+    with span("llm.queue"):
+        await ollama_limiter.acquire_async()
+    try:
+        with span("llm") as rec:
+            resp = await ollama.agenerate(f"{SYSTEM_PROMPT}\n\n{prompt}", model=model, options=options)
+            _note_generation(rec, resp)
+    finally:
+        ollama_limiter.release()
+    return resp["response"]
 
 def extract_sql(text: str) -> str:
     m = SQL_BLOCK.search(text)
@@ -0,0 +1,74 @@
+import os, json, hashlib, threading, numpy as np
+from typing import Dict, List, Optional, Tuple
+
+INDEX_DIR = os.getenv("INDEX_DIR", "index")
+VECS_FILE = "cards.npy"
+PAYLOADS_FILE = "cards.json"
+VERSION_FILE = "version"
+
+def write_snapshot(vecs, docs: List[Dict], path: str = INDEX_DIR, model: str = "") -> None:
+    """Write normalized float32 embeddings + payloads; files are swapped in atomically.
+    The version covers the embedding `model` too, so switching models publishes a new one."""
+    os.makedirs(path, exist_ok=True)
+    m = np.asarray(vecs, dtype=np.float32).copy()
+    m /= np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+    vecs_path, payloads_path = os.path.join(path, VECS_FILE), os.path.join(path, PAYLOADS_FILE)
+    with open(payloads_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(docs, f, ensure_ascii=False)
+    with open(vecs_path + ".tmp", "wb") as f:
+        np.save(f, m)
+    # payloads first: a reader that picks up the new matrix always finds matching payloads
+    os.replace(payloads_path + ".tmp", payloads_path)
+    os.replace(vecs_path + ".tmp", vecs_path)
+    version = hashlib.sha256((json.dumps(docs, sort_keys=True) + model).encode("utf-8")).hexdigest()[:16]
+    with open(os.path.join(path, VERSION_FILE + ".tmp"), "w") as f:
+        f.write(version)
+    os.replace(os.path.join(path, VERSION_FILE + ".tmp"), os.path.join(path, VERSION_FILE))
+
+def index_version(path: str = INDEX_DIR) -> Optional[str]:
+    """Content hash of the last published card set, or None if nothing was built here."""
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+class LocalIndex:
+    """Memory-mapped card snapshot; top-k is one dot product over the whole matrix."""
+
+    def __init__(self, path: str = INDEX_DIR):
+        self.path = path
+        vecs_path = os.path.join(path, VECS_FILE)
+        self.mtime = os.stat(vecs_path).st_mtime_ns
+        with open(os.path.join(path, PAYLOADS_FILE), encoding="utf-8") as f:
+            self.payloads = json.load(f)
+        # mmap: worker processes share one copy through the page cache
+        self.vecs = np.load(vecs_path, mmap_mode="r")
+
+    def search(self, v, k: int) -> List[Tuple[Dict, float]]:
+        return self.search_many(np.asarray(v, dtype=np.float32)[None, :], k)[0]
+
+    def search_many(self, vs, k: int) -> List[List[Tuple[Dict, float]]]:
+        scores = np.asarray(vs, dtype=np.float32) @ self.vecs.T
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(scores))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        out = []
+        for row, idx in zip(scores, top):
+            idx = idx[np.argsort(-row[idx])]
+            out.append([(self.payloads[i], float(row[i])) for i in idx])
+        return out
+
+_index: Optional[LocalIndex] = None
+_index_lock = threading.Lock()
+
+def get_local_index(path: str = INDEX_DIR) -> LocalIndex:
+    """Shared LocalIndex, reopened when build_index has published a new snapshot."""
+    global _index
+    mtime = os.stat(os.path.join(path, VECS_FILE)).st_mtime_ns
+    if _index is None or _index.path != path or _index.mtime != mtime:
+        with _index_lock:
+            if _index is None or _index.path != path or _index.mtime != mtime:
+                _index = LocalIndex(path)
+    return _index
@@ -0,0 +1,96 @@
+import os, re, json, time, asyncio, threading, weakref, httpx
+from typing import Dict, Optional
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "512"))
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+SQL_OPEN = re.compile(r"```sql", re.I)
+
+def sql_fence_closed(text: str) -> bool:
+    m = SQL_OPEN.search(text)
+    return m is not None and "```" in text[m.end():]
+
+class OllamaClient:
+    """Keep-alive client for /api/generate that streams tokens and hangs up once the
+    ```sql block is closed, so trailing explanation is never generated.
+
+    Hanging up mid-stream is the only way to make Ollama stop, and it closes that connection
+    (the rest of the chunked body is never read), so the pooled connection is only reused after
+    generations that run to completion; an early stop costs one reconnect to Ollama next time.
+    """
+
+    def __init__(self, url: str = OLLAMA_URL, model: str = OLLAMA_MODEL, timeout: float = OLLAMA_TIMEOUT,
+                 keep_alive: str = OLLAMA_KEEP_ALIVE, num_predict: int = OLLAMA_NUM_PREDICT,
+                 num_ctx: int = OLLAMA_NUM_CTX):
+        self.url, self.model, self.keep_alive = url.rstrip("/"), model, keep_alive
+        self.options = {"num_predict": num_predict, "num_ctx": num_ctx}
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self._client = httpx.Client(base_url=self.url, timeout=self.timeout)
+        # httpx.AsyncClient is bound to the loop it first ran on, so keep one per loop
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _payload(self, prompt: str, model: Optional[str], system: Optional[str], options: Optional[Dict]) -> Dict:
+        data = {"model": model or self.model, "prompt": prompt, "stream": True,
+                "keep_alive": self.keep_alive, "options": {**self.options, **(options or {})}}
+        if system is not None:
+            data["system"] = system
+        return data
+
+    @staticmethod
+    def _consume(chunk: Dict, parts: list, final: Dict, started: float) -> bool:
+        """Fold one streamed chunk in; True once we have what we need."""
+        if not parts:
+            final["first_token_s"] = time.perf_counter() - started
+        parts.append(chunk.get("response", ""))
+        if chunk.get("done"):
+            final.update({k: v for k, v in chunk.items() if k not in ("response", "context")})
+            return True
+        return sql_fence_closed("".join(parts))
+
+    def generate(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None,
+                 options: Optional[Dict] = None) -> Dict:
+        parts, final, started = [], {}, time.perf_counter()
+        with self._client.stream("POST", "/api/generate", json=self._payload(prompt, model, system, options)) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if line and self._consume(json.loads(line), parts, final, started):
+                    break
+        # Ollama only reports its counters in the final chunk; `chunks` (one token each) survives an early stop
+        return {"response": "".join(parts), "stopped_early": not final.get("done", False), "chunks": len(parts), **final}
+
+    def _aclient(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._aclients.get(loop)
+            if client is None:
+                client = self._aclients[loop] = httpx.AsyncClient(base_url=self.url, timeout=self.timeout)
+        return client
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None,
+                        options: Optional[Dict] = None) -> Dict:
+        parts, final, started = [], {}, time.perf_counter()
+        async with self._aclient().stream("POST", "/api/generate",
+                                          json=self._payload(prompt, model, system, options)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if line and self._consume(json.loads(line), parts, final, started):
+                    break
+        return {"response": "".join(parts), "stopped_early": not final.get("done", False), "chunks": len(parts), **final}
+
+    async def aclose(self) -> None:
+        """Close the async client of the running loop; call it before that loop shuts down."""
+        with self._lock:
+            client = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        self._client.close()
+
+ollama = OllamaClient()
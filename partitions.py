@@ -0,0 +1,125 @@
+import os, re, argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from sqlalchemy import text
+from executor import get_engine
+from result_cache import bump_data_version, ensure_data_versions
+from rollups import DAILY, HOURLY
+
+TELEMETRY_PARTITION = os.getenv("TELEMETRY_PARTITION", "day")  # day | week | month
+TELEMETRY_RETENTION_DAYS = int(os.getenv("TELEMETRY_RETENTION_DAYS", "90"))
+TELEMETRY_PARTITIONS_AHEAD_DAYS = int(os.getenv("TELEMETRY_PARTITIONS_AHEAD_DAYS", "7"))
+
+# Keep in sync with schema.sql (used when migrating an existing unpartitioned table).
+TELEMETRY_DDL = """
+CREATE TABLE telemetry (
+  ts TIMESTAMPTZ NOT NULL, sensor_id INT NOT NULL REFERENCES sensors(sensor_id),
+  value DOUBLE PRECISION NOT NULL, PRIMARY KEY (sensor_id, ts)
+) PARTITION BY RANGE (ts);
+CREATE INDEX telemetry_ts_brin ON telemetry USING brin (ts);
+"""
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+def _floor(ts: datetime, unit: str) -> datetime:
+    ts = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "week":
+        return ts - timedelta(days=ts.weekday())
+    if unit == "month":
+        return ts.replace(day=1)
+    return ts
+
+def _next(lo: datetime, unit: str) -> datetime:
+    if unit == "week":
+        return lo + timedelta(days=7)
+    if unit == "month":
+        return (lo + timedelta(days=32)).replace(day=1)
+    return lo + timedelta(days=1)
+
+def partition_ranges(start: datetime, end: datetime, unit: str = TELEMETRY_PARTITION) -> List[Tuple[datetime, datetime]]:
+    """[lo, hi) partition bounds (UTC, unit-aligned) covering start..end inclusive."""
+    out, lo = [], _floor(start, unit)
+    while lo <= end:
+        hi = _next(lo, unit)
+        out.append((lo, hi))
+        lo = hi
+    return out
+
+def is_partitioned(con) -> bool:
+    return con.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('telemetry')")).scalar() == "p"
+
+def ensure_partitions(con, start: datetime, end: datetime, unit: str = TELEMETRY_PARTITION) -> List[str]:
+    """Create any missing telemetry partitions for start..end; returns the names created."""
+    existing = {r[0] for r in con.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'telemetry'::regclass"))}
+    created = []
+    for lo, hi in partition_ranges(start, end, unit):
+        name = f"telemetry_p{lo:%Y%m%d}"
+        if name in existing:
+            continue
+        con.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF telemetry "
+                         f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"))
+        created.append(name)
+    return created
+
+def drop_old_partitions(con, retention_days: int = TELEMETRY_RETENTION_DAYS) -> List[str]:
+    """Drop partitions whose whole range is older than the retention window.
+
+    Rollup buckets before the new horizon go too, so a query answered from the rollups
+    covers the same rows as the raw one.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    dropped, horizon = [], None
+    rows = con.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'telemetry'::regclass"))
+    for name, bound in rows.fetchall():
+        m = _BOUND.search(bound or "")
+        hi = datetime.fromisoformat(m.group(2)).astimezone(timezone.utc) if m else None
+        if hi and hi <= cutoff:
+            con.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+            horizon = max(horizon or hi, hi)
+    if dropped:
+        bump_data_version(con, "telemetry")
+        # partition bounds are UTC days, weeks or months, so no bucket straddles the horizon
+        for rollup in (HOURLY, DAILY):
+            if con.execute(text("SELECT to_regclass(:t)"), {"t": rollup}).scalar() is not None:
+                con.execute(text(f"DELETE FROM {rollup} WHERE bucket < :h"), {"h": horizon})
+    return dropped
+
+def migrate(con) -> Dict:
+    """Move an unpartitioned telemetry table into the partitioned layout (one transaction)."""
+    if is_partitioned(con):
+        return {"migrated": False}
+    con.execute(text("ALTER TABLE telemetry RENAME TO telemetry_legacy"))
+    con.execute(text("ALTER INDEX IF EXISTS telemetry_pkey RENAME TO telemetry_legacy_pkey"))
+    con.execute(text(TELEMETRY_DDL))
+    lo, hi = con.execute(text("SELECT min(ts), max(ts) FROM telemetry_legacy")).one()
+    now = datetime.now(timezone.utc)
+    created = ensure_partitions(con, lo or now, max(hi or now, now) + timedelta(days=TELEMETRY_PARTITIONS_AHEAD_DAYS))
+    rows = con.execute(text("INSERT INTO telemetry (ts, sensor_id, value) "
+                            "SELECT ts, sensor_id, value FROM telemetry_legacy ORDER BY ts")).rowcount
+    con.execute(text("DROP TABLE telemetry_legacy"))
+    ensure_data_versions(con)  # the triggers went with the old table
+    return {"migrated": True, "rows": rows, "partitions": len(created)}
+
+def maintain(con, ahead_days: int = TELEMETRY_PARTITIONS_AHEAD_DAYS,
+             retention_days: int = TELEMETRY_RETENTION_DAYS) -> Dict:
+    now = datetime.now(timezone.utc)
+    return {"created": ensure_partitions(con, now, now + timedelta(days=ahead_days)),
+            "dropped": drop_old_partitions(con, retention_days)}
+
+def main():
+    ap = argparse.ArgumentParser(description="Partition maintenance for telemetry (run daily, e.g. from cron).")
+    ap.add_argument("--migrate", action="store_true", help="convert an existing unpartitioned telemetry table first")
+    ap.add_argument("--ahead", type=int, default=TELEMETRY_PARTITIONS_AHEAD_DAYS, help="days of partitions to pre-create")
+    ap.add_argument("--retention", type=int, default=TELEMETRY_RETENTION_DAYS, help="drop partitions older than N days")
+    args = ap.parse_args()
+    with get_engine().begin() as con:
+        if args.migrate:
+            print(migrate(con))
+        print(maintain(con, args.ahead, args.retention))
+
+if __name__ == "__main__":
+    main()
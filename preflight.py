@@ -0,0 +1,70 @@
+import os, asyncio
+from typing import Dict, Optional, Tuple
+from sqlglot import exp
+from sqlguard import GuardResult, validate
+from executor import explain
+
+PREFLIGHT_MAX_COST = float(os.getenv("PREFLIGHT_MAX_COST", "1000000"))
+PREFLIGHT_MAX_ROWS = float(os.getenv("PREFLIGHT_MAX_ROWS", "100000"))
+AUTO_LIMIT = int(os.getenv("AUTO_LIMIT", "1000"))
+
+class PreflightError(Exception):
+    def __init__(self, msg: str, plan: Dict):
+        super().__init__(msg)
+        self.plan = plan
+
+def _is_aggregate(select: exp.Select) -> bool:
+    if select.args.get("group"):
+        return True
+    for e in select.expressions:
+        for agg in e.find_all(exp.AggFunc):
+            # window functions and scalar subqueries do not collapse the outer row set
+            if agg.find_ancestor(exp.Window) is None and agg.find_ancestor(exp.Select) is select:
+                return True
+    return False
+
+def inject_limit(guard: GuardResult, limit: int = AUTO_LIMIT) -> Tuple[str, bool]:
+    """Add LIMIT to a row-returning (non-aggregate) query that has none.
+
+    The clause is appended to the SQL text, which works whether or not `guard.lossless`.
+    """
+    ast = guard.ast
+    if ast.args.get("limit"):
+        return guard.sql, False
+    if isinstance(ast, exp.Select) and _is_aggregate(ast):
+        return guard.sql, False
+    sql = guard.sql.rstrip().rstrip(";").rstrip()
+    limited = f"{sql}\nLIMIT {int(limit)}"  # own line, so a trailing -- comment cannot swallow it
+    check = validate(limited)
+    if check.ok and check.ast.args.get("limit") and check.tables == guard.tables:
+        return limited, True
+    return f"SELECT * FROM (\n{sql}\n) q LIMIT {int(limit)}", True
+
+def plan_summary(plan: Dict) -> Dict:
+    root = plan["Plan"]
+    seq_scans, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan":
+            seq_scans.append(node.get("Relation Name"))
+        stack.extend(node.get("Plans", []))
+    return {"node": root["Node Type"], "total_cost": root["Total Cost"],
+            "rows": root["Plan Rows"], "seq_scans": sorted(set(seq_scans))}
+
+def preflight(sql: str, guard: Optional[GuardResult] = None) -> Dict:
+    """Inject LIMIT where needed, EXPLAIN, and refuse plans over the cost/row thresholds.
+
+    Raises PreflightError for plans that are too expensive; planner errors (unknown
+    column, ...) propagate like execution errors would.
+    """
+    guard = guard or validate(sql)
+    sql, limited = inject_limit(guard)
+    plan = plan_summary(explain(sql))
+    if plan["total_cost"] > PREFLIGHT_MAX_COST:
+        raise PreflightError(f"estimated cost {plan['total_cost']:.0f} exceeds {PREFLIGHT_MAX_COST:.0f}", plan)
+    if plan["rows"] > PREFLIGHT_MAX_ROWS:
+        raise PreflightError(f"estimated {plan['rows']} rows exceeds {PREFLIGHT_MAX_ROWS:.0f}", plan)
+    return {"sql": sql, "limit_injected": limited, "plan": plan}
+
+async def preflight_async(sql: str, guard: Optional[GuardResult] = None) -> Dict:
+    return await asyncio.to_thread(preflight, sql, guard)
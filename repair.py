@@ -0,0 +1,152 @@
+import os, re, difflib
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+from sqlglot import exp
+from cards import SKIP_TABLES
+from catalog import get_catalog
+from sqlguard import validate
+
+SCHEMA_REPAIR = os.getenv("SCHEMA_REPAIR", "1") == "1"
+REPAIR_CUTOFF = float(os.getenv("SCHEMA_REPAIR_CUTOFF", "0.75"))  # difflib similarity needed for a fuzzy match
+
+_DIGITS = re.compile(r"\d+")
+
+def _norm(s: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", s.lower())
+
+def closest(word: str, options: List[str], cutoff: float = REPAIR_CUTOFF) -> Optional[str]:
+    """Best fuzzy match, ignoring case and punctuation. Numbers must agree, so Jig-12 never becomes Jig-1."""
+    by_norm = {}
+    for o in options:
+        by_norm.setdefault(_norm(o), o)
+    if _norm(word) in by_norm:
+        return by_norm[_norm(word)]
+    digits = _DIGITS.findall(word)
+    pool = [n for n, o in by_norm.items() if _DIGITS.findall(o) == digits]
+    hit = difflib.get_close_matches(_norm(word), pool, n=1, cutoff=cutoff)
+    return by_norm[hit[0]] if hit else None
+
+def _fk_graph(cat: Dict) -> Dict[str, List[Tuple[str, str, str]]]:
+    """table -> [(its column, other table, other column)], both directions."""
+    g: Dict[str, List[Tuple[str, str, str]]] = {}
+    for t, info in cat["tables"].items():
+        for fk in info["foreign_keys"]:
+            g.setdefault(t, []).append((fk["column"], fk["ref_table"], fk["ref_column"]))
+            g.setdefault(fk["ref_table"], []).append((fk["ref_column"], t, fk["column"]))
+    return g
+
+def _join_path(g: Dict, start: Set[str], target: str) -> Optional[List[Tuple[str, str, str, str]]]:
+    """Shortest FK path from any of `start` to `target`, as (from table, column, to table, column) hops."""
+    prev: Dict[str, Optional[Tuple]] = {t: None for t in start}
+    todo = deque(sorted(start))
+    while todo:
+        t = todo.popleft()
+        if t == target:
+            path = []
+            while prev[t] is not None:
+                path.append(prev[t])
+                t = prev[t][0]
+            return path[::-1]
+        for col, other, ocol in g.get(t, []):
+            if other not in prev:
+                prev[other] = (t, col, other, ocol)
+                todo.append(other)
+    return None
+
+def _columns(cat: Dict, table: str) -> List[str]:
+    return [c["name"] for c in cat["tables"].get(table, {}).get("columns", [])]
+
+def _values(cat: Dict, table: str, column: str) -> List[str]:
+    vals = cat.get("values", {})
+    if table == "sensors" and column == "name":
+        return [v[0] for v in vals.get("sensors", [])]
+    if table == "machines" and column in ("name", "area"):
+        return sorted({v[0 if column == "name" else 1] for v in vals.get("machines", []) if v[0 if column == "name" else 1]})
+    return []
+
+def schema_repair(sql: str, catalog: Optional[Dict] = None, literals_only: bool = False) -> Optional[Dict]:
+    """Fix `sql` against the schema catalog without asking the LLM: unknown tables and columns are
+    fuzzy-matched to real ones, sensor/machine names to real tags, and tables referenced only through
+    an alias are joined in along the FK graph. Returns {"sql", "fixes"}, or None if nothing changed."""
+    g = validate(sql)
+    if not g.ok or not g.lossless:
+        return None
+    cat = catalog or get_catalog()
+    # bookkeeping tables are never a plausible target for a misspelled name or a join
+    cat = {**cat, "tables": {t: v for t, v in cat["tables"].items() if t not in SKIP_TABLES}}
+    tables = list(cat["tables"])
+    ast = g.ast.copy()
+    ctes = {c.alias_or_name for c in ast.find_all(exp.CTE)}
+    fixes: List[str] = []
+
+    if not literals_only:
+        for t in ast.find_all(exp.Table):
+            if t.name not in ctes and t.name not in cat["tables"]:
+                real = closest(t.name, tables)
+                if real:
+                    fixes.append(f"table {t.name} -> {real}")
+                    t.set("this", exp.to_identifier(real))
+    aliases = {t.alias_or_name: t.name for t in ast.find_all(exp.Table)}
+    if not literals_only:
+        derived = ctes | {s.alias for s in ast.find_all(exp.Subquery) if s.alias}
+        _fix_columns(ast, cat, aliases, derived, fixes)
+    for pred in ast.find_all(exp.EQ, exp.NEQ, exp.In):
+        col = pred.this if isinstance(pred.this, exp.Column) else pred.expression
+        if not isinstance(col, exp.Column):
+            continue
+        table = aliases.get(col.table) if col.table else next(
+            (t for t in aliases.values() if col.name in _columns(cat, t)), None)
+        options = _values(cat, table, col.name)
+        lits = pred.expressions if isinstance(pred, exp.In) else [pred.expression if col is pred.this else pred.this]
+        for lit in lits:
+            if options and isinstance(lit, exp.Literal) and lit.is_string and lit.this not in options:
+                real = closest(lit.this, options)
+                if real:
+                    fixes.append(f"{table}.{col.name} '{lit.this}' -> '{real}'")
+                    lit.replace(exp.Literal.string(real))
+    if not fixes:
+        return None
+    return {"sql": ast.sql(dialect="postgres"), "fixes": fixes}
+
+def _fix_columns(ast: exp.Expression, cat: Dict, aliases: Dict[str, str], derived: Set[str], fixes: List[str]) -> None:
+    output = {a.alias for a in ast.find_all(exp.Alias)}
+    graph = _fk_graph(cat)
+    for col in list(ast.find_all(exp.Column)):
+        if col.table in derived or (not col.table and col.name in output) or col.name == "*":
+            continue
+        if col.table and col.table not in aliases:
+            _join_missing(ast, cat, graph, aliases, col, fixes)
+            continue
+        scope = [aliases[col.table]] if col.table else list(dict.fromkeys(aliases.values()))
+        if any(t not in cat["tables"] or col.name in _columns(cat, t) for t in scope):
+            continue
+        real = closest(col.name, [c for t in scope for c in _columns(cat, t)])
+        if real:
+            fixes.append(f"column {col.sql(dialect='postgres')} -> {real}")
+            col.set("this", exp.to_identifier(real))
+        elif not col.table:
+            owners = [t for t in cat["tables"] if col.name in _columns(cat, t)]
+            if len(owners) == 1 and _add_join(ast, graph, aliases, owners[0], owners[0], fixes):
+                col.set("table", exp.to_identifier(owners[0]))
+
+def _join_missing(ast, cat, graph, aliases, col: exp.Column, fixes: List[str]) -> None:
+    """`m.name` with no `m` in FROM: join the table that has the column, preferring one named like the alias."""
+    present = set(aliases.values())
+    owners = [t for t in cat["tables"] if col.name in _columns(cat, t) and t not in present]
+    owners.sort(key=lambda t: (not t.startswith(col.table.lower()), t))
+    if owners:
+        _add_join(ast, graph, aliases, owners[0], col.table, fixes)
+
+def _add_join(ast, graph, aliases: Dict[str, str], target: str, alias: str, fixes: List[str]) -> bool:
+    if not isinstance(ast, exp.Select):
+        return False
+    path = _join_path(graph, {t for t in aliases.values() if t in graph}, target)
+    if not path:
+        return False
+    by_table = {t: a for a, t in aliases.items()}
+    for src, col, dst, dcol in path:
+        a = alias if dst == target else dst
+        ast.join(f"{dst} AS {a}" if a != dst else dst, on=f"{by_table[src]}.{col} = {a}.{dcol}", copy=False)
+        aliases[a], by_table[dst] = dst, a
+        fixes.append(f"join {dst}" + (f" {a}" if a != dst else "") + f" on {by_table[src]}.{col} = {a}.{dcol}")
+    return True
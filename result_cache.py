@@ -0,0 +1,164 @@
+import os, json, time, threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlglot import exp
+from executor import connection
+from sqlguard import GuardResult
+from tracing import METRICS, Counter
+
+RESULT_CACHE = os.getenv("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))  # entries
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL_NOW = float(os.getenv("RESULT_CACHE_TTL_NOW", "30"))  # windows relative to CURRENT_TIMESTAMP
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "900"))  # everything else without a fixed range
+RESULT_CACHE_TTL_CLOSED = float(os.getenv("RESULT_CACHE_TTL_CLOSED", "86400"))  # literal or CURRENT_DATE ranges
+RESULT_CACHE_CHECK_S = float(os.getenv("RESULT_CACHE_CHECK_S", "1"))  # how often table versions are polled
+
+RESULTS = Counter("nl2sql_result_cache_total", "Result cache lookups.", ("result",))
+METRICS.append(RESULTS)
+
+# anything reading the clock finer than a day, and functions that make a result unrepeatable
+NOW_FUNCS = {"clock_timestamp", "statement_timestamp", "transaction_timestamp", "timeofday"}
+NOW_NAMES = {"localtimestamp", "localtime"}
+VOLATILE_FUNCS = {"random", "gen_random_uuid", "nextval", "setseed"}
+TIME_COLUMNS = {"ts", "bucket"}
+# Postgres' special date/time input strings: 'now'::timestamptz, 'yesterday'::date, ...
+NOW_LITERALS = {"now"}
+DAY_LITERALS = {"today", "yesterday", "tomorrow"}
+UNTIL_MIDNIGHT = -1.0
+
+DATA_VERSIONS_DDL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_versions.sql")
+
+# version of every table that has the data_versions trigger (0 until its first write), and the
+# seconds to the database's next midnight, so "today"/"yesterday" expire on its clock
+VERSION_SQL = """
+SELECT c.relname AS tbl, coalesce(v.version, 0) AS version,
+       extract(epoch FROM date_trunc('day', now()) + interval '1 day' - now()) AS to_midnight
+FROM pg_trigger g
+JOIN pg_class c ON c.oid = g.tgrelid
+LEFT JOIN data_versions v ON v.tbl = c.relname
+WHERE g.tgname = c.relname || '_data_version'
+"""
+
+def ensure_data_versions(con) -> None:
+    with open(DATA_VERSIONS_DDL, encoding="utf-8") as f:
+        con.execute(text(f.read()))
+
+def bump_data_version(con, table: str) -> None:
+    """For changes no trigger sees, such as dropping a partition."""
+    if con.execute(text("SELECT to_regclass('data_versions')")).scalar() is not None:
+        con.execute(text("""INSERT INTO data_versions (tbl, version, changed_at) VALUES (:t, 1, now())
+                            ON CONFLICT (tbl) DO UPDATE SET version = data_versions.version + 1,
+                                changed_at = EXCLUDED.changed_at"""), {"t": table})
+
+def ttl_for(ast: exp.Expression) -> Optional[float]:
+    """Seconds a result of `ast` stays valid with unchanged data; None = never cache."""
+    names = {n.name.lower() for n in ast.find_all(exp.Anonymous)}
+    if ast.find(exp.Rand) or names & VOLATILE_FUNCS:
+        return None
+    cols = {c.name.lower() for c in ast.find_all(exp.Column) if not c.table}
+    words = {(l.name.split() or [""])[0].lower() for l in ast.find_all(exp.Literal) if l.is_string}
+    if ast.find(exp.CurrentTimestamp, exp.CurrentTime) or names & NOW_FUNCS or cols & NOW_NAMES \
+            or words & NOW_LITERALS:
+        return RESULT_CACHE_TTL_NOW
+    if ast.find(exp.CurrentDate) or words & DAY_LITERALS:
+        return UNTIL_MIDNIGHT
+    if any(c.name in TIME_COLUMNS for c in ast.find_all(exp.Column) if c.find_ancestor(exp.Where, exp.Having)):
+        return RESULT_CACHE_TTL_CLOSED  # filtered on time, with literals only
+    return RESULT_CACHE_TTL
+
+class ResultCache:
+    """Canonical SQL -> executed result (preview, row count, plan).
+
+    Each entry remembers the data_versions of every table it read and is dropped as soon as one of
+    them moves (new telemetry or lab samples). TTLs come from the query: short when it is relative to
+    CURRENT_TIMESTAMP, until midnight when it is relative to CURRENT_DATE, long for literal ranges.
+    The least recently used entries go first once `size` entries or `max_bytes` are exceeded.
+    """
+
+    def __init__(self, size: int = RESULT_CACHE_SIZE, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 check_s: float = RESULT_CACHE_CHECK_S):
+        self.size, self.max_bytes, self.check_s = size, max_bytes, check_s
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._version_lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._midnight = 0.0
+        self._checked = 0.0
+
+    def versions(self) -> Dict[str, int]:
+        """Current table versions, re-read from Postgres at most every `check_s` seconds.
+        Empty (nothing gets cached) until data_versions.sql is installed."""
+        with self._version_lock:
+            now = time.time()
+            if now - self._checked >= self.check_s:
+                try:
+                    with connection() as con:
+                        rows = con.execute(text(VERSION_SQL)).fetchall()
+                except ProgrammingError:
+                    rows = []
+                self._versions = {r.tbl: r.version for r in rows}
+                self._midnight = now + float(rows[0].to_midnight) if rows else now
+                self._checked = now
+            return self._versions
+
+    def get(self, guard: GuardResult) -> Optional[Dict]:
+        """The cached result and its "columns", if every table it read is unchanged and it has not expired."""
+        with self._lock:
+            e = self._entries.get(guard.canonical)
+        if e is None:
+            RESULTS.inc(result="miss")
+            return None
+        current = self.versions()
+        if time.time() >= e["expires"] or any(current.get(t) != v for t, v in e["versions"].items()):
+            self._drop(guard.canonical, e)
+            RESULTS.inc(result="stale")
+            return None
+        with self._lock:
+            if guard.canonical in self._entries:
+                self._entries.move_to_end(guard.canonical)
+        RESULTS.inc(result="hit")
+        return {**e["result"], "columns": e["columns"]}
+
+    def put(self, guard: GuardResult, result: Dict, columns, versions: Dict[str, int]) -> None:
+        """Store `result`; `versions` must be taken before the query ran, so a load racing it invalidates it."""
+        ttl = ttl_for(guard.ast)
+        if ttl is None:
+            return
+        tables = set(guard.tables) | ({result["rollup"]} if result.get("rollup") else set())
+        if not tables <= set(versions):
+            return  # a table without the data_versions trigger
+        if ttl == UNTIL_MIDNIGHT:
+            ttl = min(self._midnight - time.time(), RESULT_CACHE_TTL_CLOSED)
+        nbytes = len(json.dumps(result, default=str))
+        if nbytes > self.max_bytes:
+            return
+        e = {"result": result, "columns": list(columns), "versions": {t: versions[t] for t in tables},
+             "expires": time.time() + ttl, "bytes": nbytes}
+        with self._lock:
+            old = self._entries.pop(guard.canonical, None)
+            self._bytes += nbytes - (old["bytes"] if old else 0)
+            self._entries[guard.canonical] = e
+            while len(self._entries) > self.size or self._bytes > self.max_bytes:
+                _, gone = self._entries.popitem(last=False)
+                self._bytes -= gone["bytes"]
+
+    def _drop(self, key: str, e: Dict) -> None:
+        with self._lock:
+            if self._entries.get(key) is e:
+                del self._entries[key]
+                self._bytes -= e["bytes"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+result_cache = ResultCache()
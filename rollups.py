@@ -0,0 +1,248 @@
+import os, re, time, argparse
+from typing import Dict, Optional
+from sqlalchemy import text
+from sqlglot import exp
+from catalog import get_catalog
+from executor import connection, get_engine
+from sqlguard import GuardResult
+
+ROLLUP_REWRITE = os.getenv("ROLLUP_REWRITE", "1") == "1"
+ROLLUP_MAX_LAG_S = float(os.getenv("ROLLUP_MAX_LAG_S", "900"))
+ROLLUP_DDL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rollups.sql")
+
+HOURLY, DAILY = "telemetry_hourly", "telemetry_daily"
+# 0 = hour-aligned, 1 = day-aligned (or coarser); anything finer cannot use a rollup
+UNIT_RANK = {"HOUR": 0, "DAY": 1, "WEEK": 1, "MONTH": 1, "QUARTER": 1, "YEAR": 1}
+AGGS = (exp.Avg, exp.Min, exp.Max, exp.Sum, exp.Count)
+JOINABLE = {"sensors", "machines"}  # N:1 from telemetry, so joining them does not change row counts
+_DAY_LITERAL = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]00(:00(:00)?)?)?$")
+_HOUR_LITERAL = re.compile(r"^\d{4}-\d{2}-\d{2}[ T]\d{2}(:00(:00)?)?$")
+
+def ensure_rollups(con) -> None:
+    with open(ROLLUP_DDL, encoding="utf-8") as f:
+        con.execute(text(f.read()))
+
+def refresh_rollups(con, since=None) -> Dict:
+    """Recompute hourly buckets from `since` (default: last watermark, or everything),
+    then roll the touched days up from the hourly table. Upserts, so it is idempotent."""
+    con.execute(text("SET LOCAL TimeZone = 'UTC'"))
+    if since is None:
+        since = con.execute(text("SELECT refreshed_to FROM rollup_watermarks WHERE rollup = :r"),
+                            {"r": HOURLY}).scalar()
+    lo = {"lo": since}
+    hi = con.execute(text("SELECT max(ts) FROM telemetry WHERE ts >= COALESCE(CAST(:lo AS timestamptz), '-infinity')"), lo).scalar()
+    if hi is None:
+        return {"since": since, "to": None, "hourly": 0, "daily": 0}
+    hourly = con.execute(text(f"""
+        INSERT INTO {HOURLY} (bucket, sensor_id, n, value_sum, value_min, value_max)
+        SELECT date_trunc('hour', ts), sensor_id, count(*), sum(value), min(value), max(value)
+        FROM telemetry WHERE ts >= date_trunc('hour', COALESCE(CAST(:lo AS timestamptz), '-infinity'))
+        GROUP BY 1, 2
+        ON CONFLICT (sensor_id, bucket) DO UPDATE SET n = EXCLUDED.n, value_sum = EXCLUDED.value_sum,
+            value_min = EXCLUDED.value_min, value_max = EXCLUDED.value_max"""), lo).rowcount
+    daily = con.execute(text(f"""
+        INSERT INTO {DAILY} (bucket, sensor_id, n, value_sum, value_min, value_max)
+        SELECT date_trunc('day', bucket), sensor_id, sum(n), sum(value_sum), min(value_min), max(value_max)
+        FROM {HOURLY} WHERE bucket >= date_trunc('day', COALESCE(CAST(:lo AS timestamptz), '-infinity'))
+        GROUP BY 1, 2
+        ON CONFLICT (sensor_id, bucket) DO UPDATE SET n = EXCLUDED.n, value_sum = EXCLUDED.value_sum,
+            value_min = EXCLUDED.value_min, value_max = EXCLUDED.value_max"""), lo).rowcount
+    con.execute(text("""
+        INSERT INTO rollup_watermarks (rollup, refreshed_to, refreshed_at)
+        VALUES (:h, :hi, now()), (:d, :hi, now())
+        ON CONFLICT (rollup) DO UPDATE SET refreshed_to = EXCLUDED.refreshed_to,
+            refreshed_at = EXCLUDED.refreshed_at"""), {"h": HOURLY, "d": DAILY, "hi": hi})
+    return {"since": since, "to": hi, "hourly": hourly, "daily": daily}
+
+_fresh = {"checked": 0.0, "ok": False}
+
+def rollups_fresh() -> bool:
+    """Rollups exist and were refreshed within ROLLUP_MAX_LAG_S (checked at most every 30s)."""
+    now = time.time()
+    if now - _fresh["checked"] > 30:
+        try:
+            with connection() as con:
+                age = con.execute(text(
+                    "SELECT extract(epoch FROM now() - min(refreshed_at)) FROM rollup_watermarks")).scalar()
+            _fresh["ok"] = age is not None and float(age) <= ROLLUP_MAX_LAG_S
+        except Exception:
+            _fresh["ok"] = False
+        _fresh["checked"] = now
+    return _fresh["ok"]
+
+def _unit_rank(unit: Optional[exp.Expression]) -> Optional[int]:
+    return UNIT_RANK.get(unit.name.upper().rstrip("S")) if unit is not None else None
+
+def _interval_rank(iv: exp.Interval) -> Optional[int]:
+    unit = iv.args.get("unit")
+    if unit is None:  # INTERVAL '3 days' kept as a single literal
+        parts = iv.this.name.split()
+        return UNIT_RANK.get(parts[-1].upper().rstrip("S")) if len(parts) == 2 else None
+    return _unit_rank(unit)
+
+def _aligned_rank(e: exp.Expression) -> Optional[int]:
+    """How coarse a bucket boundary `e` is guaranteed to fall on (see UNIT_RANK)."""
+    if isinstance(e, exp.Paren):
+        return _aligned_rank(e.this)
+    if isinstance(e, (exp.TimestampTrunc, exp.DateTrunc)):
+        return _unit_rank(e.args.get("unit"))
+    if isinstance(e, exp.CurrentDate):
+        return 1
+    if isinstance(e, exp.Cast):
+        if e.to.this == exp.DataType.Type.DATE:
+            return 1
+        return _aligned_rank(e.this) if isinstance(e.this, exp.Literal) else None
+    if isinstance(e, exp.Literal) and e.is_string:
+        return 1 if _DAY_LITERAL.match(e.name) else 0 if _HOUR_LITERAL.match(e.name) else None
+    if isinstance(e, (exp.Add, exp.Sub)):
+        base, iv = e.this, e.expression
+        if isinstance(e, exp.Add) and isinstance(base, exp.Interval):
+            base, iv = iv, base
+        if isinstance(iv, exp.Interval):
+            a, b = _aligned_rank(base), _interval_rank(iv)
+            return None if a is None or b is None else min(a, b)
+    return None
+
+def _ts_rank(col: exp.Column) -> Optional[int]:
+    """Granularity at which this use of telemetry.ts can be answered from buckets."""
+    p = col.parent
+    if isinstance(p, (exp.TimestampTrunc, exp.DateTrunc)) and p.this is col:
+        return _unit_rank(p.args.get("unit"))
+    if isinstance(p, exp.Cast) and p.to.this == exp.DataType.Type.DATE:
+        return 1
+    # ts >= X and ts < X are exact on bucket boundaries (bucket = floor(ts)); > and <= are not
+    if isinstance(p, (exp.GTE, exp.LT)) and p.this is col:
+        return _aligned_rank(p.expression)
+    if isinstance(p, (exp.LTE, exp.GT)) and p.expression is col:
+        return _aligned_rank(p.this)
+    return None
+
+def _joined_columns(catalog: Optional[Dict], tables) -> Optional[Dict[str, set]]:
+    """Column names per table of the query, or None without a catalog to prove where a name comes from."""
+    if catalog is None:
+        try:
+            catalog = get_catalog()
+        except Exception:
+            return None
+    cols = {t: {c["name"] for c in catalog["tables"].get(t, {}).get("columns", [])} for t in tables}
+    return cols if all(cols.values()) else None
+
+def rewrite_to_rollup(guard: GuardResult, catalog: Optional[Dict] = None) -> Optional[Dict]:
+    """Point a bucketed or whole-range aggregate over telemetry at the hourly/daily rollup.
+
+    Only rewrites when the result is provably identical: AVG/SUM/MIN/MAX/COUNT over
+    telemetry.value (or COUNT(*)), inner joins to sensors/machines only, and every use of
+    telemetry.ts aligned to the rollup bucket. Returns None to keep the raw query.
+    """
+    ast = guard.ast
+    if not guard.lossless:
+        return None
+    if not isinstance(ast, exp.Select) or ast.args.get("with") or ast.args.get("distinct"):
+        return None
+    if any(t.args.get("zone") for t in ast.find_all(exp.TimestampTrunc, exp.DateTrunc)):
+        return None  # buckets are UTC days and hours
+    if any(isinstance(n, (exp.Select, exp.Subquery, exp.Window)) for n in ast.walk() if n is not ast):
+        return None
+    if any(j.side for j in ast.args.get("joins") or []):  # outer joins count unmatched rows
+        return None
+    tables = list(ast.find_all(exp.Table))
+    tel = [t for t in tables if t.name == "telemetry"]
+    if len(tel) != 1 or any(t.name not in JOINABLE and t.name != "telemetry" for t in tables):
+        return None
+    alias, single = tel[0].alias_or_name, len(tables) == 1
+    if not single:
+        # an unqualified name must provably come from sensors/machines: telemetry's own
+        # columns do not exist on the rollup, and row-level filters cannot be answered from buckets
+        outputs = {e.alias for e in ast.expressions if e.alias}
+        loose = {c.name for c in ast.find_all(exp.Column) if not c.table}
+        if loose:
+            cols = _joined_columns(catalog, {t.name for t in tables})
+            if cols is None:
+                return None
+            for name in loose:
+                owners = [t for t, cs in cols.items() if name in cs]
+                if owners != [] and (len(owners) != 1 or owners[0] == "telemetry"):
+                    return None
+                if not owners and name not in outputs:
+                    return None
+
+    def is_tel(c, name=None):
+        return isinstance(c, exp.Column) and (c.table == alias or (single and not c.table)) \
+            and (name is None or c.name == name)
+
+    for agg in ast.find_all(exp.AggFunc):
+        if isinstance(agg.parent, exp.Filter):  # FILTER (WHERE ...) is a row-level condition
+            return None
+        ok = isinstance(agg, AGGS) and (is_tel(agg.this, "value") or
+                                        (isinstance(agg, exp.Count) and isinstance(agg.this, exp.Star)))
+        if not ok:
+            return None
+    if not any(True for _ in ast.find_all(exp.AggFunc)):
+        return None
+    need = 1
+    for col in ast.find_all(exp.Column):
+        if not is_tel(col) or col.name == "sensor_id":
+            continue
+        if col.name == "value" and isinstance(col.parent, AGGS):
+            continue
+        r = _ts_rank(col) if col.name == "ts" else None
+        if r is None:
+            return None
+        need = min(need, r)
+    if not rollups_fresh():
+        return None
+    rollup = DAILY if need >= 1 else HOURLY
+
+    def col(name, like):
+        return exp.column(name, table=like.table or None)
+
+    def swap(node):
+        if isinstance(node, exp.Table) and node.name == "telemetry":
+            t = node.copy()
+            t.set("this", exp.to_identifier(rollup))
+            if not t.alias:
+                t.set("alias", exp.TableAlias(this=exp.to_identifier("telemetry")))
+            return t
+        if isinstance(node, AGGS):
+            arg = node.this if is_tel(node.this) else exp.column("n", table=alias if not single else None)
+            if isinstance(node, exp.Avg):
+                out = exp.Paren(this=exp.Div(this=exp.Sum(this=col("value_sum", arg)), expression=exp.Sum(this=col("n", arg))))
+            elif isinstance(node, exp.Sum):
+                out = exp.Sum(this=col("value_sum", arg))
+            elif isinstance(node, exp.Min):
+                out = exp.Min(this=col("value_min", arg))
+            elif isinstance(node, exp.Max):
+                out = exp.Max(this=col("value_max", arg))
+            else:
+                out = exp.Coalesce(this=exp.Sum(this=col("n", arg)), expressions=[exp.Literal.number(0)])
+            # keep the output column name Postgres would have given the original aggregate
+            if isinstance(node.parent, exp.Select) and node.arg_key == "expressions":
+                out = exp.alias_(out, node.key)
+            return out
+        if is_tel(node, "ts"):
+            return col("bucket", node)
+        return node
+
+    new = ast.copy().transform(swap)
+    return {"sql": new.sql(dialect="postgres"), "rollup": rollup}
+
+def main():
+    ap = argparse.ArgumentParser(description="Create and incrementally refresh telemetry rollups.")
+    ap.add_argument("--full", action="store_true", help="recompute every bucket, not just since the watermark")
+    ap.add_argument("--every", type=float, default=0, help="keep refreshing every N seconds")
+    args = ap.parse_args()
+    with get_engine().begin() as con:
+        ensure_rollups(con)
+    full = args.full
+    while True:
+        with get_engine().begin() as con:
+            if full:
+                con.execute(text(f"TRUNCATE {HOURLY}, {DAILY}, rollup_watermarks"))
+            print(refresh_rollups(con))
+        full = False
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+-- Pre-aggregated telemetry per sensor and bucket (buckets computed in UTC).
+CREATE TABLE IF NOT EXISTS telemetry_hourly (
+  bucket TIMESTAMPTZ NOT NULL, sensor_id INT NOT NULL REFERENCES sensors(sensor_id),
+  n BIGINT NOT NULL, value_sum DOUBLE PRECISION NOT NULL,
+  value_min DOUBLE PRECISION NOT NULL, value_max DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (sensor_id, bucket)
+);
+CREATE TABLE IF NOT EXISTS telemetry_daily (
+  bucket TIMESTAMPTZ NOT NULL, sensor_id INT NOT NULL REFERENCES sensors(sensor_id),
+  n BIGINT NOT NULL, value_sum DOUBLE PRECISION NOT NULL,
+  value_min DOUBLE PRECISION NOT NULL, value_max DOUBLE PRECISION NOT NULL,
+  PRIMARY KEY (sensor_id, bucket)
+);
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+  rollup TEXT PRIMARY KEY, refreshed_to TIMESTAMPTZ NOT NULL, refreshed_at TIMESTAMPTZ NOT NULL
+);
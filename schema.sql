@@ -3,10 +3,12 @@ CREATE TABLE sensors (
   sensor_id SERIAL PRIMARY KEY, machine_id INT REFERENCES machines(machine_id),
   name TEXT NOT NULL, unit TEXT, description TEXT
 );
+-- Range-partitioned by time; partitions are created/dropped by partitions.py.
 CREATE TABLE telemetry (
-  ts TIMESTAMPTZ NOT NULL, sensor_id INT REFERENCES sensors(sensor_id),
-  value DOUBLE PRECISION NOT NULL, PRIMARY KEY (ts, sensor_id)
-);
+  ts TIMESTAMPTZ NOT NULL, sensor_id INT NOT NULL REFERENCES sensors(sensor_id),
+  value DOUBLE PRECISION NOT NULL, PRIMARY KEY (sensor_id, ts)
+) PARTITION BY RANGE (ts);
+CREATE INDEX telemetry_ts_brin ON telemetry USING brin (ts);
 CREATE TABLE lab_samples (
   sample_id SERIAL PRIMARY KEY, ts TIMESTAMPTZ NOT NULL,
   machine_id INT REFERENCES machines(machine_id),
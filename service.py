@@ -0,0 +1,202 @@
+import os, json, asyncio, argparse, functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+import app as pipeline
+from embeddings import embed_queries, normalize_question
+from executor import pool_stats, warmup
+from limits import Overloaded, limiter_stats, ollama_limiter
+from result_cache import result_cache
+from tracing import METRICS, Counter, render
+
+# Enough pipeline threads for every call the Ollama limiter lets run or wait, plus spares, so
+# questions answered from the caches never queue behind parked generations.
+SERVICE_SPARE_WORKERS = int(os.getenv("SERVICE_SPARE_WORKERS", "8"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", str(ollama_limiter.limit + ollama_limiter.queue + SERVICE_SPARE_WORKERS)))
+# distinct questions in progress; never more than there are threads, so admitted work starts at once
+SERVICE_MAX_INFLIGHT = min(int(os.getenv("SERVICE_MAX_INFLIGHT", str(SERVICE_WORKERS))), SERVICE_WORKERS)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+
+COALESCED = Counter("nl2sql_coalesced_total", "Requests that joined an identical in-flight question.")
+EMBED_BATCHES = Counter("nl2sql_embed_batches_total", "Micro-batched embedding calls.")
+METRICS.extend([COALESCED, EMBED_BATCHES])
+
+_pool = ThreadPoolExecutor(SERVICE_WORKERS, thread_name_prefix="answer")
+_embed_pool = ThreadPoolExecutor(EMBED_WORKERS, thread_name_prefix="embed")  # never behind answers
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=str, ensure_ascii=False)
+
+class EmbedBatcher:
+    """Questions that arrive within `window` seconds of each other share one embed_queries call."""
+
+    def __init__(self, window: float = EMBED_BATCH_WINDOW_MS / 1000, max_batch: int = EMBED_BATCH_MAX):
+        self.window, self.max_batch = window, max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def embed(self, question: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((question, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        EMBED_BATCHES.inc()
+        try:
+            vecs = await asyncio.get_running_loop().run_in_executor(_embed_pool, embed_queries, [q for q, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), v in zip(batch, vecs):
+            if not fut.done():
+                fut.set_result(v)
+
+class Flight:
+    """One question being answered; every request for it replays and follows the same events."""
+
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.done = False
+        self._changed = asyncio.Event()
+
+    def push(self, event: Dict, final: bool = False) -> None:
+        self.events.append(event)
+        self.done = self.done or final
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self, timings: bool = True):
+        """The events so far, then each new one; `timings` are only passed on when asked for,
+        since the flight always collects them for whichever request wants them."""
+        i = 0
+        while True:
+            while i < len(self.events):
+                e = self.events[i]
+                yield e if timings or "timings" not in e else {k: v for k, v in e.items() if k != "timings"}
+                i += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+_flights: Dict[str, Flight] = {}
+_batcher = EmbedBatcher()
+
+async def _run(key: str, question: str, flight: Flight) -> None:
+    loop = asyncio.get_running_loop()
+
+    def emit(event: Dict) -> None:  # called from the worker thread
+        loop.call_soon_threadsafe(flight.push, event)
+
+    try:
+        qvec = await _batcher.embed(question)
+        res = await loop.run_in_executor(_pool, functools.partial(
+            pipeline.answer, question, timings=True, qvec=qvec,
+            on_sql=lambda sql: emit({"event": "sql", "sql": sql}),
+            on_preview=lambda cols, rows: emit({"event": "preview", "columns": cols, "rows": rows})))
+        final = {"event": "result", **res}
+    except Overloaded as e:
+        final = {"event": "error", "error": "overloaded", "backend": e.backend, "exception": str(e)}
+    except Exception as e:
+        final = {"event": "error", "error": "internal", "exception": f"{type(e).__name__}: {e}"}
+    finally:
+        _flights.pop(key, None)
+    flight.push(final, final=True)
+
+def _start(question: str) -> Flight:
+    key = normalize_question(question)
+    flight = _flights.get(key)
+    if flight is not None:
+        COALESCED.inc()
+        return flight
+    if len(_flights) >= SERVICE_MAX_INFLIGHT:
+        raise Overloaded("service", f"{SERVICE_MAX_INFLIGHT} questions in flight")
+    flight = _flights[key] = Flight()
+    asyncio.ensure_future(_run(key, question, flight))
+    return flight
+
+class Ask(BaseModel):
+    question: str
+    timings: bool = False
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI):
+    # open the pool's first connections before traffic arrives; a database that is down is not fatal
+    try:
+        await asyncio.to_thread(warmup)
+    except Exception as e:
+        print(f"DB pool warmup failed: {e}")
+    yield
+
+api = FastAPI(title="Industrial NL2SQL", lifespan=_lifespan)
+
+def _overloaded(detail: str) -> Response:
+    return Response(_dumps({"error": "overloaded", "detail": detail}), status_code=429,
+                    media_type="application/json", headers={"Retry-After": "1"})
+
+@api.exception_handler(Overloaded)
+async def _on_overloaded(request: Request, e: Overloaded) -> Response:
+    return _overloaded(str(e))
+
+@api.post("/answer")
+async def answer(ask: Ask) -> Response:
+    last: Dict = {}
+    async for last in _start(ask.question).follow(ask.timings):
+        pass
+    if last.get("error") == "overloaded":
+        return _overloaded(last["exception"])
+    body = {k: v for k, v in last.items() if k != "event"}  # events are shared with coalesced requests
+    return Response(_dumps(body), status_code=500 if last.get("error") == "internal" else 200,
+                    media_type="application/json")
+
+@api.post("/answer/stream")
+async def answer_stream(ask: Ask) -> StreamingResponse:
+    """NDJSON: `sql` as soon as it passes the guard, `preview` with the first rows, then `result` (or `error`)."""
+    flight = _start(ask.question)
+
+    async def lines():
+        async for event in flight.follow(ask.timings):
+            yield _dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@api.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+@api.get("/health")
+async def health() -> Dict:
+    return {"in_flight": len(_flights), "limits": limiter_stats(), "db_pool": pool_stats(),
+            "result_cache": result_cache.stats()}
+
+def main():
+    import uvicorn
+    ap = argparse.ArgumentParser(description="HTTP service around app.answer.")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8000)
+    args = ap.parse_args()
+    uvicorn.run(api, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
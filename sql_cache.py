@@ -0,0 +1,77 @@
+import os, re, time, threading, numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from embeddings import normalize_question
+from local_index import index_version
+
+SQL_CACHE_THRESHOLD = float(os.getenv("SQL_CACHE_THRESHOLD", "0.95"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "512"))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "3600"))
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_WINDOW = re.compile(r"\b(second|minute|hour|shift|day|week|month|quarter|year|today|yesterday)s?\b")
+
+def question_facts(question: str) -> Tuple:
+    """Numbers, quoted literals and time-window words: what tells Jig-1 from Jig-2 or
+    "last 24 hours" from "last 7 days" when the embeddings are nearly identical."""
+    q = normalize_question(question)
+    return (sorted(_NUMBER.findall(q)), sorted(a or b for a, b in _QUOTED.findall(q)),
+            sorted(set(_WINDOW.findall(q))))
+
+class SemanticSQLCache:
+    """Question embedding -> validated SQL, matched by cosine similarity among the entries whose
+    question has the same numbers, quoted literals and window words (question_facts).
+
+    Entries expire after `ttl` seconds, the least recently used are evicted past `size`,
+    and everything is dropped when build_index publishes a new card set.
+    """
+
+    def __init__(self, threshold: float = SQL_CACHE_THRESHOLD, size: int = SQL_CACHE_SIZE,
+                 ttl: float = SQL_CACHE_TTL):
+        self.threshold, self.size, self.ttl = threshold, size, ttl
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = index_version()
+
+    def _sync(self, now: float) -> None:
+        version = index_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        for key in [k for k, e in self._entries.items() if now - e["stored_at"] > self.ttl]:
+            del self._entries[key]
+
+    def get(self, vec: np.ndarray, question: str) -> Optional[Dict]:
+        facts = question_facts(question)
+        with self._lock:
+            self._sync(time.time())
+            keys = [k for k, e in self._entries.items() if e["facts"] == facts]
+            if not keys:
+                return None
+            scores = np.stack([self._entries[k]["vec"] for k in keys]) @ vec
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._entries.move_to_end(keys[best])
+            e = self._entries[keys[best]]
+            return {"question": e["question"], "sql": e["sql"], "score": float(scores[best])}
+
+    def put(self, question: str, vec: np.ndarray, sql: str) -> None:
+        with self._lock:
+            key = normalize_question(question)
+            self._entries[key] = {"question": question, "vec": vec, "sql": sql,
+                                  "facts": question_facts(question), "stored_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, question: str) -> None:
+        with self._lock:
+            self._entries.pop(normalize_question(question), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+sql_cache = SemanticSQLCache()
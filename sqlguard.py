@@ -1,45 +1,118 @@
-import re
+import os
 import sqlglot
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple
 from sqlglot import exp
+from sqlglot.dialects.postgres import Postgres
 
-FORBIDDEN = re.compile(
-    r"\b(insert|update|delete|drop|alter|create|truncate|grant|revoke|call|copy|vacuum|analyze)\b",
-    re.I,
-)
+GUARD_CACHE_SIZE = int(os.getenv("SQL_GUARD_CACHE_SIZE", "2048"))
 
-def is_single_statement(sql: str) -> bool:
+# Node types that write, lock or otherwise leave the read-only SELECT world. Checked on the
+# AST, so words like "update" or "analyze" inside literals and aliases are fine.
+FORBIDDEN_NODES = tuple(getattr(exp, n) for n in (
+    "Insert", "Update", "Delete", "Merge", "Create", "Drop", "Alter", "AlterTable",
+    "TruncateTable", "Copy", "Command", "Into", "Lock", "Set", "Use", "Transaction",
+    "Commit", "Rollback", "Pragma", "Kill",
+) if hasattr(exp, n))
+
+@dataclass(frozen=True)
+class GuardResult:
+    ok: bool
+    sql: str
+    reason: Optional[str] = None
+    # Parsed tree, shared through the memo cache: call .copy() before mutating it.
+    ast: Optional[exp.Expression] = field(default=None, compare=False, repr=False)
+    canonical: Optional[str] = None
+    tables: FrozenSet[str] = frozenset()
+    columns: FrozenSet[Tuple[str, str]] = frozenset()  # (table or "" if unqualified, column)
+    # Whether SQL regenerated from `ast` keeps every literal and identifier. sqlglot silently drops
+    # function arguments it does not model (date_trunc's time zone, ...) while parsing, so anything
+    # that rewrites the query through `ast` must check this first and otherwise leave the SQL alone.
+    lossless: bool = False
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+def _is_select_tree(ast: exp.Expression) -> bool:
+    # SELECT (incl. WITH), set operations between selects, and subquery wrapping
+    if isinstance(ast, exp.Select):
+        return True
+    if isinstance(ast, (exp.Union, exp.Except, exp.Intersect)):
+        return _is_select_tree(ast.left) and _is_select_tree(ast.right)
+    if isinstance(ast, exp.Subquery):
+        return _is_select_tree(ast.this)
+    return False
+
+def _references(ast: exp.Expression) -> Tuple[FrozenSet[str], FrozenSet[Tuple[str, str]]]:
+    ctes = {c.alias_or_name for c in ast.find_all(exp.CTE)}
+    aliases, tables = {}, set()
+    for t in ast.find_all(exp.Table):
+        if t.name in ctes:
+            continue
+        tables.add(t.name)
+        aliases[t.alias_or_name] = t.name
+    columns = {(aliases.get(c.table, c.table), c.name) for c in ast.find_all(exp.Column)
+               if c.table not in ctes}
+    return frozenset(tables), frozenset(columns)
+
+def _operands(sql: str) -> Optional[list]:
+    """Literal and name texts in token order. Function names are skipped (now() comes back as
+    CURRENT_TIMESTAMP) and string literals split on blanks (INTERVAL '1 day' as INTERVAL '1' DAY);
+    unquoted names and literal case are folded (units like 'day')."""
     try:
-        statements = sqlglot.parse(sql, read="postgres")
-        return len(statements) == 1
+        toks = Postgres().tokenize(sql)
     except Exception:
-        return False
+        return None
+    out = []
+    for t, nxt in zip(toks, toks[1:] + [None]):
+        kind = t.token_type.name
+        if kind == "IDENTIFIER":
+            out.append(("id", t.text))
+        elif kind == "STRING":
+            out += [("lit", w) for w in t.text.lower().split()]
+        elif kind in ("NUMBER", "VAR") and not (nxt is not None and nxt.token_type.name == "L_PAREN"):
+            out.append(("lit", t.text.lower()))
+    return out
 
-def is_select_ast(sql: str) -> bool:
+def _round_trips(sql: str, generated: str) -> bool:
+    # the loss happens while parsing, so it shows in the token streams, not in the trees
+    ops = _operands(sql)
+    return ops is not None and ops == _operands(generated)
+
+@lru_cache(maxsize=GUARD_CACHE_SIZE)
+def _validate(sql: str) -> GuardResult:
     try:
-        ast = sqlglot.parse_one(sql, read="postgres")
-        if ast is None:
-            return False
-        # Accept SELECT, UNION/UNION ALL (top-level set ops between selects), and subquery wrapping
-        if isinstance(ast, exp.Select):
-            return True
-        if isinstance(ast, (exp.Union, exp.Except, exp.Intersect)):
-            return isinstance(ast.left, exp.Select) and isinstance(ast.right, exp.Select)
-        if isinstance(ast, exp.Subquery) and isinstance(ast.this, exp.Select):
-            return True
-        return False
+        statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
     except Exception:
-        return False
+        return GuardResult(False, sql, "parse-error")
+    if len(statements) != 1:
+        return GuardResult(False, sql, "multiple-statements" if statements else "empty")
+    ast = statements[0]
+    if not _is_select_tree(ast):
+        return GuardResult(False, sql, "not-select")
+    bad = next((n for n in ast.walk() if isinstance(n, FORBIDDEN_NODES)), None)
+    if bad is not None:
+        return GuardResult(False, sql, f"forbidden-{type(bad).__name__.lower()}")
+    tables, columns = _references(ast)
+    canonical = ast.sql(dialect="postgres", normalize=True, comments=False)
+    lossless = _round_trips(sql, canonical)
+    return GuardResult(True, sql, None, ast, canonical if lossless else sql, tables, columns, lossless=lossless)
+
+def validate(sql: str) -> GuardResult:
+    """Parse `sql` once and check it is a single read-only SELECT.
+
+    Results are memoized per SQL string; `canonical` (normalized, comment-free SQL, or the
+    SQL as given when normalizing would lose something) is meant as a cache key and `ast`
+    for later rewrite stages, which must leave the SQL alone unless `lossless`.
+    """
+    return _validate(sql.strip())
+
+def is_single_statement(sql: str) -> bool:
+    return validate(sql).reason not in ("parse-error", "multiple-statements", "empty")
+
+def is_select_ast(sql: str) -> bool:
+    return validate(sql).reason not in ("parse-error", "multiple-statements", "empty", "not-select")
 
 def is_safe(sql: str) -> bool:
-    s = sql.strip()
-    # reject multiple statements
-    if not is_single_statement(s):
-        return False
-    # must start with SELECT (fast path)
-    if not s.lower().lstrip().startswith("select"):
-        return False
-    # forbid dangerous keywords anywhere
-    if FORBIDDEN.search(s):
-        return False
-    # parse & ensure it's a SELECT-like AST
-    return is_select_ast(s)
+    return validate(sql).ok
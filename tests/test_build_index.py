@@ -0,0 +1,45 @@
+import json, os
+import numpy as np
+from qdrant_client import QdrantClient
+import build_index
+from local_index import index_version, write_snapshot
+
+def _snapshot(path, model):
+    docs = [{"id": "a", "text": "telemetry"}, {"id": "b", "text": "sensors"}]
+    write_snapshot(np.eye(2, 4, dtype=np.float32), docs, str(path), model)
+    with open(os.path.join(path, build_index.MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"version": index_version(str(path)), "model": model}, f)
+
+def test_vectors_reused_for_the_same_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_index, "INDEX_DIR", str(tmp_path))
+    _snapshot(tmp_path, "model-a")
+    assert sorted(build_index.previous_vectors("model-a")) == ["a", "b"]
+
+def test_other_or_unrecorded_model_reembeds(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_index, "INDEX_DIR", str(tmp_path))
+    _snapshot(tmp_path, "model-a")
+    assert build_index.previous_vectors("model-b") == {}
+    with open(tmp_path / build_index.MANIFEST, "w", encoding="utf-8") as f:
+        json.dump({"version": index_version(str(tmp_path))}, f)
+    assert build_index.previous_vectors("model-a") == {}
+
+def test_version_depends_on_model(tmp_path):
+    _snapshot(tmp_path / "a", "model-a")
+    _snapshot(tmp_path / "b", "model-b")
+    assert index_version(str(tmp_path / "a")) != index_version(str(tmp_path / "b"))
+
+def test_card_id_follows_content_not_id():
+    a = build_index.card_id({"id": "x", "type": "table", "text": "telemetry"})
+    assert a == build_index.card_id({"id": "y", "type": "table", "text": "telemetry"})
+    assert a != build_index.card_id({"id": "x", "type": "table", "text": "telemetry (ts)"})
+
+def test_publish_moves_the_alias_and_keeps_one_previous(monkeypatch):
+    monkeypatch.setattr(build_index, "KEEP_PREVIOUS", True)
+    client, coll = QdrantClient(":memory:"), build_index.COLL
+    docs = [{"id": build_index.card_id({"text": t}), "text": t} for t in ("telemetry", "sensors")]
+    vecs = np.eye(2, 4, dtype=np.float32)
+    for version in ("v1", "v2", "v3"):
+        assert build_index.publish_qdrant(client, docs, vecs, version) == f"{coll}_{version}"
+    assert {a.alias_name: a.collection_name for a in client.get_aliases().aliases} == {coll: f"{coll}_v3"}
+    assert sorted(c.name for c in client.get_collections().collections) == [f"{coll}_v2", f"{coll}_v3"]
+    assert client.count(coll).count == 2
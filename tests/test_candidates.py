@@ -0,0 +1,47 @@
+import asyncio
+import candidates
+from tracing import span, trace
+
+def test_no_sql_from_any_candidate_is_not_unsafe(monkeypatch):
+    async def hang(prompt, options=None):
+        await asyncio.sleep(10)
+    monkeypatch.setattr(candidates, "call_ollama_async", hang)
+    res = candidates.generate_sql("average bed height", [{"type": "table", "text": "telemetry"}], n=2, timeout=0.05)
+    assert res["error"] == "no-candidate" and res["sql"] == ""
+    assert [r["error"] for r in res["rejected"]] == ["timeout"]
+
+def test_failed_generations_are_reported(monkeypatch):
+    async def down(prompt, options=None):
+        raise ConnectionError("ollama is down")
+    monkeypatch.setattr(candidates, "call_ollama_async", down)
+    res = candidates.generate_sql("average bed height", [{"type": "table", "text": "telemetry"}], n=2, timeout=1)
+    assert res["error"] == "no-candidate"
+    assert {r["error"] for r in res["rejected"]} == {"generation-failed"}
+
+def test_safe_sql_that_fails_explain_is_kept_for_repair(monkeypatch):
+    async def gen(prompt, options=None):
+        return "```sql\nSELECT avg(valu) FROM telemetry\n```"
+    async def explain(sql):
+        raise RuntimeError('column "valu" does not exist')
+    monkeypatch.setattr(candidates, "call_ollama_async", gen)
+    monkeypatch.setattr(candidates, "preflight_async", explain)
+    res = candidates.generate_sql("average bed height", [{"type": "table", "text": "telemetry"}], n=2, timeout=1)
+    assert "error" not in res and res["sql"].startswith("SELECT avg(valu)")
+    assert res["prompt_tokens"] > 0
+
+def test_races_share_one_loop_and_keep_trace_spans(monkeypatch):
+    loops = []
+    async def gen(prompt, options=None):
+        loops.append(asyncio.get_running_loop())
+        with span("llm"):
+            return "```sql\nSELECT 1\n```"
+    async def explain(sql):
+        return {"sql": sql, "plan": {}, "limit_injected": False}
+    monkeypatch.setattr(candidates, "call_ollama_async", gen)
+    monkeypatch.setattr(candidates, "preflight_async", explain)
+    with trace() as spans:
+        for _ in range(2):
+            assert candidates.generate_sql("q", [{"type": "table", "text": "t"}], n=1, timeout=1)["ok"]
+    assert len(set(loops)) == 1
+    assert [s["stage"] for s in spans] == ["prompt", "llm", "prompt", "llm"]
+    assert spans[0]["tokens"] > 0 and spans[0]["cards"] == 1
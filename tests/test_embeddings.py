@@ -0,0 +1,35 @@
+import numpy as np
+import embeddings
+from embeddings import EmbeddingCache, normalize_question
+
+def _v(x):
+    return np.array([x, 1 - x], dtype=np.float32)
+
+def test_memory_tier_is_lru():
+    cache = EmbeddingCache(size=2, path="")
+    cache.put_many({"a": _v(0.1), "b": _v(0.2)})
+    assert list(cache.get_many(["a"])) == ["a"]  # a is now the most recent
+    cache.put_many({"c": _v(0.3)})
+    assert sorted(cache.get_many(["a", "b", "c"])) == ["a", "c"]
+
+def test_sqlite_tier_survives_restart_per_model(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    EmbeddingCache(size=4, path=path, model="m1").put_many({"q": _v(0.5)})
+    again = EmbeddingCache(size=4, path=path, model="m1").get_many(["q", "other"])
+    assert list(again) == ["q"] and np.array_equal(again["q"], _v(0.5))
+    assert EmbeddingCache(size=4, path=path, model="m2").get_many(["q"]) == {}
+
+def test_embed_queries_encodes_each_miss_once(monkeypatch):
+    calls = []
+    class Model:
+        def encode(self, texts, normalize_embeddings):
+            calls.append(list(texts))
+            return np.array([_v(len(t) / 100) for t in texts])
+    monkeypatch.setattr(embeddings, "_cache", EmbeddingCache(size=8, path=""))
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: Model())
+    out = embeddings.embed_queries(["Bed height?", "bed  HEIGHT?", "flow"])
+    assert calls == [["bed height?", "flow"]]
+    assert out.shape == (3, 2) and np.array_equal(out[0], out[1])
+    embeddings.embed_queries(["flow"])
+    assert len(calls) == 1
+    assert normalize_question("  Bed\tHeight ") == "bed height"
@@ -0,0 +1,21 @@
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+import executor
+from limits import Limiter
+
+def test_queued_async_queries_do_not_hold_executor_threads(monkeypatch):
+    monkeypatch.setattr(executor, "postgres_limiter", Limiter("postgres-test", 1, 8, 5))
+    monkeypatch.setattr(executor, "_run_sql", lambda sql: time.sleep(0.3) or sql)
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(2))
+        queries = [asyncio.create_task(executor.run_sql_async(f"q{i}")) for i in range(3)]
+        await asyncio.sleep(0.05)
+        t0 = time.perf_counter()
+        await asyncio.to_thread(lambda: None)  # a free thread, although two queries are queued
+        waited = time.perf_counter() - t0
+        return waited, await asyncio.gather(*queries)
+
+    waited, results = asyncio.run(main())
+    assert waited < 0.2
+    assert results == ["q0", "q1", "q2"]
@@ -0,0 +1,26 @@
+import struct
+import numpy as np
+from gen_data import COPY_HEADER, COPY_TRAILER, CopyStream, copy_rows
+
+def test_copy_rows_binary_layout():
+    ts = np.array(["2000-01-01T00:00:01", "2024-03-01T12:00:00"], dtype="datetime64[s]")
+    ids = np.array([7, 2**31 - 1], dtype=np.int64)
+    vals = np.array([1.5, -0.25])
+    buf = copy_rows(ts, ids, vals)
+    row = struct.Struct(">h i q i i i d")
+    assert len(buf) == 2 * row.size
+    assert row.unpack_from(buf, 0) == (3, 8, 1_000_000, 4, 7, 8, 1.5)
+    n, _, us, _, sid, _, v = row.unpack_from(buf, row.size)
+    assert (n, sid, v) == (3, 2**31 - 1, -0.25)
+    assert us == (np.datetime64("2024-03-01T12:00:00", "us") - np.datetime64("2000-01-01", "us")).astype(np.int64)
+
+def test_copy_stream_reads_across_chunks():
+    stream = CopyStream(iter([COPY_HEADER, b"abc", b"", b"defg", COPY_TRAILER]))
+    out = b""
+    while True:
+        part = stream.read(5)
+        if not part:
+            break
+        assert len(part) <= 5
+        out += part
+    assert out == COPY_HEADER + b"abcdefg" + COPY_TRAILER
@@ -0,0 +1,45 @@
+import asyncio, threading, time
+import pytest
+from limits import Limiter, Overloaded
+
+def test_full_queue_is_rejected_at_once():
+    lim = Limiter("test-full", 1, 1, 5)
+    lim.acquire()
+    waiter = threading.Thread(target=lambda: (lim.acquire(), lim.release()))
+    waiter.start()
+    while lim.stats()["waiting"] < 1:
+        time.sleep(0.001)
+    t0 = time.perf_counter()
+    with pytest.raises(Overloaded) as e:
+        lim.acquire()
+    assert time.perf_counter() - t0 < 0.1
+    assert e.value.backend == "test-full" and isinstance(e.value, TimeoutError)
+    lim.release()
+    waiter.join()
+    s = lim.stats()
+    assert (s["in_flight"], s["waiting"], s["rejected"], s["waits"]) == (0, 0, 1, 1)
+
+def test_wait_times_out():
+    lim = Limiter("test-timeout", 1, 4, 0.05)
+    with lim.slot():
+        with pytest.raises(Overloaded, match="no slot within"):
+            lim.acquire()
+    assert lim.stats()["timeouts"] == 1 and lim.stats()["waiting"] == 0
+
+def test_async_waiter_gets_the_slot_and_cancel_leaks_nothing():
+    lim = Limiter("test-async", 1, 4, 5)
+
+    async def main():
+        lim.acquire()
+        got = asyncio.create_task(lim.acquire_async())
+        gone = asyncio.create_task(lim.acquire_async())
+        await asyncio.sleep(0.02)
+        gone.cancel()
+        await asyncio.gather(gone, return_exceptions=True)
+        lim.release()
+        await asyncio.wait_for(got, 1)
+        lim.release()
+
+    asyncio.run(main())
+    s = lim.stats()
+    assert (s["in_flight"], s["waiting"]) == (0, 0)
@@ -0,0 +1,34 @@
+import threading, time
+import llm
+from limits import Limiter
+from tracing import trace
+
+def test_queue_wait_is_not_llm_latency(monkeypatch):
+    limiter = Limiter("ollama-test", 1, 4, 5)
+    monkeypatch.setattr(llm, "ollama_limiter", limiter)
+    monkeypatch.setattr(llm.ollama, "generate", lambda prompt, model=None, options=None: {"response": "SELECT 1"})
+    limiter.acquire()
+    threading.Timer(0.2, limiter.release).start()
+    with trace() as spans:
+        assert llm.call_ollama("q") == "SELECT 1"
+    ms = {s["stage"]: s["ms"] for s in spans}
+    assert ms["llm.queue"] >= 150 and ms["llm"] < 100
+    assert limiter.stats()["in_flight"] == 0
+
+def _card(kind, i, words=5):
+    return {"type": kind, "text": f"{kind} card {i} " + "word " * words}
+
+def test_prompt_quotas_and_dedup():
+    cards = [_card("column", i) for i in range(4)] + [_card("column", 0), _card("value", 0), llm.CORE_SCHEMA[0]]
+    p = llm.assemble_prompt("q", cards, budget=10_000, quotas={"column": 2, "value": 1})
+    assert [c["text"] for c in p["cards"]] == [cards[0]["text"], cards[1]["text"], cards[5]["text"]]
+    assert p["dropped"] == 2  # two columns over quota; the duplicate and the core card are skipped silently
+    assert p["prompt"].startswith(llm.PROMPT_PREFIX) and p["prompt"].rstrip().endswith("User question: q")
+
+def test_prompt_budget_keeps_rank_order():
+    cards = [_card("column", 0, 10), _card("column", 1, 400), _card("column", 2, 10)]
+    budget = llm.assemble_prompt("q", [], budget=10_000)["tokens"] + 60
+    p = llm.assemble_prompt("q", cards, budget=budget, quotas={"column": 9})
+    assert [c["text"] for c in p["cards"]] == [cards[0]["text"], cards[2]["text"]]
+    assert p["tokens"] <= budget and p["dropped"] == 1
+    assert p["prompt"].index("column card 0") < p["prompt"].index("column card 2")
@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta, timezone
+from partitions import partition_ranges
+
+UTC = timezone.utc
+
+def test_days_cover_the_range_in_utc():
+    start = datetime(2024, 3, 1, 23, 30, tzinfo=timezone(timedelta(hours=-2)))  # 2024-03-02 01:30 UTC
+    ranges = partition_ranges(start, datetime(2024, 3, 4, 0, 0, tzinfo=UTC), "day")
+    assert ranges[0] == (datetime(2024, 3, 2, tzinfo=UTC), datetime(2024, 3, 3, tzinfo=UTC))
+    assert ranges[-1] == (datetime(2024, 3, 4, tzinfo=UTC), datetime(2024, 3, 5, tzinfo=UTC))
+    assert all(hi == lo for (_, hi), (lo, _) in zip(ranges, ranges[1:]))
+
+def test_weeks_start_on_monday():
+    ranges = partition_ranges(datetime(2024, 3, 6, tzinfo=UTC), datetime(2024, 3, 12, tzinfo=UTC), "week")
+    assert ranges == [(datetime(2024, 3, 4, tzinfo=UTC), datetime(2024, 3, 11, tzinfo=UTC)),
+                      (datetime(2024, 3, 11, tzinfo=UTC), datetime(2024, 3, 18, tzinfo=UTC))]
+
+def test_months_follow_calendar_lengths():
+    ranges = partition_ranges(datetime(2024, 1, 31, tzinfo=UTC), datetime(2024, 3, 1, tzinfo=UTC), "month")
+    assert [lo.month for lo, _ in ranges] == [1, 2, 3]
+    assert ranges[1] == (datetime(2024, 2, 1, tzinfo=UTC), datetime(2024, 3, 1, tzinfo=UTC))
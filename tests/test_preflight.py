@@ -0,0 +1,17 @@
+from preflight import inject_limit
+from sqlguard import validate
+
+def test_limit_keeps_the_sql_text():
+    sql = "SELECT date_trunc('day', ts, 'Asia/Kolkata') d, value FROM telemetry;"
+    out, limited = inject_limit(validate(sql), 1000)
+    assert limited
+    assert out.startswith("SELECT date_trunc('day', ts, 'Asia/Kolkata') d, value FROM telemetry")
+    assert out.endswith("LIMIT 1000")
+
+def test_limit_after_trailing_comment():
+    out, _ = inject_limit(validate("SELECT name FROM sensors -- every tag"), 10)
+    assert validate(out).ast.args["limit"].expression.name == "10"
+
+def test_aggregates_and_limited_queries_untouched():
+    for sql in ("SELECT avg(value) FROM telemetry", "SELECT name FROM sensors LIMIT 3"):
+        assert inject_limit(validate(sql)) == (sql, False)
@@ -0,0 +1,35 @@
+from repair import closest, schema_repair
+
+CATALOG = {
+    "tables": {
+        "machines": {"columns": [{"name": "machine_id"}, {"name": "name"}, {"name": "area"}], "foreign_keys": []},
+        "sensors": {"columns": [{"name": "sensor_id"}, {"name": "machine_id"}, {"name": "name"}, {"name": "unit"}],
+                    "foreign_keys": [{"column": "machine_id", "ref_table": "machines", "ref_column": "machine_id"}]},
+        "telemetry": {"columns": [{"name": "ts"}, {"name": "sensor_id"}, {"name": "value"}],
+                      "foreign_keys": [{"column": "sensor_id", "ref_table": "sensors", "ref_column": "sensor_id"}]},
+        "data_versions": {"columns": [{"name": "tbl"}, {"name": "version"}, {"name": "changed_at"}], "foreign_keys": []},
+    },
+    "values": {"sensors": [["bed_height_mm", "mm", "Bed height", 2]], "machines": [["Jig-1", "Plant-A"], ["Jig-2", "Plant-A"]]},
+}
+
+def test_fixes_identifiers_and_tags():
+    fix = schema_repair("SELECT avg(t.valu) FROM telemetri t JOIN sensors s ON t.sensor_id = s.sensor_id "
+                        "WHERE s.name = 'bed height'", CATALOG)
+    assert "FROM telemetry AS t" in fix["sql"] and "AVG(t.value)" in fix["sql"]
+    assert "'bed_height_mm'" in fix["sql"]
+
+def test_joins_missing_alias_along_foreign_keys():
+    fix = schema_repair("SELECT avg(t.value) FROM telemetry t WHERE m.name = 'jig 1'", CATALOG)
+    assert "JOIN sensors ON t.sensor_id = sensors.sensor_id" in fix["sql"]
+    assert "JOIN machines AS m ON sensors.machine_id = m.machine_id" in fix["sql"]
+    assert "m.name = 'Jig-1'" in fix["sql"]
+
+def test_numbers_must_agree():
+    assert closest("Jig-12", ["Jig-1", "Jig-2"]) is None
+
+def test_bookkeeping_tables_are_not_targets():
+    assert schema_repair("SELECT versio FROM data_version", CATALOG) is None
+
+def test_lossy_sql_is_left_alone():
+    assert schema_repair("SELECT date_trunc('day', ts, 'Asia/Kolkata'), avg(valu) FROM telemetry GROUP BY 1",
+                         CATALOG) is None
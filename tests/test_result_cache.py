@@ -0,0 +1,45 @@
+import time
+import pytest
+from result_cache import RESULT_CACHE_TTL_CLOSED, RESULT_CACHE_TTL_NOW, UNTIL_MIDNIGHT, ResultCache, ttl_for
+from sqlguard import validate
+
+def _cache() -> ResultCache:
+    cache = ResultCache(check_s=1e9)  # no Postgres: versions are set by hand and never re-read
+    cache._versions, cache._checked, cache._midnight = {"telemetry": 1}, time.time(), time.time() + 3600
+    return cache
+
+def test_lossy_canonical_does_not_share_an_entry():
+    cache = _cache()
+    utc = validate("SELECT date_trunc('day', ts) d, avg(value) FROM telemetry GROUP BY 1")
+    zoned = validate("SELECT date_trunc('day', ts, 'Asia/Kolkata') d, avg(value) FROM telemetry GROUP BY 1")
+    cache.put(utc, {"sql": utc.sql, "rows": 1, "preview": [{"d": "utc"}]}, ["d"], cache.versions())
+    assert cache.get(zoned) is None
+    assert cache.get(utc)["preview"] == [{"d": "utc"}]
+
+def test_equivalent_sql_shares_an_entry():
+    cache = _cache()
+    a = validate("select avg(value) from telemetry where ts >= '2024-01-01' and ts < '2024-01-02'")
+    b = validate("SELECT AVG(value)\nFROM telemetry WHERE ts >= '2024-01-01' AND ts < '2024-01-02'")
+    cache.put(a, {"sql": a.sql, "rows": 1, "preview": [{"avg": 1.0}]}, ["avg"], cache.versions())
+    assert cache.get(b)["columns"] == ["avg"]
+
+def test_table_version_change_invalidates():
+    cache = _cache()
+    g = validate("SELECT count(*) FROM telemetry")
+    cache.put(g, {"sql": g.sql, "rows": 1, "preview": [{"count": 3}]}, ["count"], cache.versions())
+    cache._versions = {"telemetry": 2}
+    assert cache.get(g) is None
+
+@pytest.mark.parametrize("where, ttl", [
+    ("ts >= now() - interval '1 hour'", RESULT_CACHE_TTL_NOW),
+    ("ts >= 'now'::timestamptz - interval '1 hour'", RESULT_CACHE_TTL_NOW),
+    ("ts >= current_date - 1 AND ts < current_date", UNTIL_MIDNIGHT),
+    ("ts >= 'yesterday'::date AND ts < 'today'::date", UNTIL_MIDNIGHT),
+    ("ts >= 'Tomorrow'", UNTIL_MIDNIGHT),
+    ("ts >= '2024-01-01' AND ts < '2024-01-02'", RESULT_CACHE_TTL_CLOSED),
+])
+def test_ttl_follows_the_time_window(where, ttl):
+    assert ttl_for(validate(f"SELECT avg(value) FROM telemetry WHERE {where}").ast) == ttl
+
+def test_volatile_queries_are_not_cached():
+    assert ttl_for(validate("SELECT random() FROM telemetry").ast) is None
@@ -0,0 +1,28 @@
+import llm
+from bm25 import BM25Index, tokenize, write_bm25
+
+DOCS = [{"id": "t", "text": "telemetry: ts, sensor_id, value"},
+        {"id": "bed", "text": "sensor bed_height_mm (mm): Bed height of the jig"},
+        {"id": "cr", "text": "lab_samples.tailings_cr2o3_pct: Cr2O3 in tailings"}]
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("Jig-1 bed_height_mm") == ["jig-1", "jig", "1", "bed_height_mm", "bed", "height", "mm"]
+
+def test_bm25_finds_exact_tags(tmp_path):
+    write_bm25(DOCS, str(tmp_path))
+    idx = BM25Index(str(tmp_path))
+    assert [i for i, _ in idx.search("bed_height_mm last shift", 3)] == [1]
+    assert idx.search("Cr2O3 losses", 3)[0][0] == 2
+    assert idx.search("unrelated words", 3) == []
+
+def test_rrf_rewards_agreement():
+    a, b, c = ({"id": x, "text": x} for x in "abc")
+    fused = llm.fuse([(a, 0.9), (b, 0.8)], [(b, 7.0), (c, 5.0)], k=3, fusion="rrf")
+    assert [p["id"] for p in fused] == ["b", "a", "c"]
+
+def test_weighted_fusion_scales_bm25_by_its_max():
+    a, b = {"id": "a", "text": "a"}, {"id": "b", "text": "b"}
+    vector, lexical = [(a, 0.9), (b, 0.5)], [(b, 20.0), (a, 2.0)]
+    assert [p["id"] for p in llm.fuse(vector, lexical, k=2, fusion="weighted", alpha=0.9)] == ["a", "b"]
+    assert [p["id"] for p in llm.fuse(vector, lexical, k=2, fusion="weighted", alpha=0.3)] == ["b", "a"]
+    assert len(llm.fuse(vector, lexical, k=1, fusion="weighted", alpha=0.5)) == 1
@@ -0,0 +1,53 @@
+import pytest
+import rollups
+from rollups import rewrite_to_rollup
+from sqlguard import validate
+
+CATALOG = {"tables": {
+    "telemetry": {"columns": [{"name": "ts"}, {"name": "sensor_id"}, {"name": "value"}]},
+    "sensors": {"columns": [{"name": "sensor_id"}, {"name": "machine_id"}, {"name": "name"}, {"name": "unit"}]},
+    "machines": {"columns": [{"name": "machine_id"}, {"name": "name"}, {"name": "area"}]},
+}}
+JOIN = "FROM telemetry t JOIN sensors s ON s.sensor_id = t.sensor_id"
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    monkeypatch.setattr(rollups, "rollups_fresh", lambda: True)
+
+def rewrite(sql):
+    return rewrite_to_rollup(validate(sql), CATALOG)
+
+def test_daily_buckets():
+    rw = rewrite("SELECT date_trunc('day', ts) d, avg(value) FROM telemetry "
+                 "WHERE ts >= '2024-01-01' AND ts < '2024-01-08' GROUP BY 1")
+    assert rw["rollup"] == "telemetry_daily"
+    assert "value_sum" in rw["sql"] and "bucket" in rw["sql"]
+
+def test_hourly_buckets_with_qualified_join():
+    rw = rewrite(f"SELECT date_trunc('hour', t.ts) h, max(t.value) {JOIN} WHERE s.name = 'bed_height_mm' GROUP BY 1")
+    assert rw["rollup"] == "telemetry_hourly"
+    assert "MAX(t.value_max)" in rw["sql"]
+
+def test_unqualified_sensor_column_is_fine():
+    rw = rewrite(f"SELECT unit, avg(t.value) {JOIN} GROUP BY unit")
+    assert rw["rollup"] == "telemetry_daily"
+
+@pytest.mark.parametrize("sql", [
+    f"SELECT avg(t.value), ts::date {JOIN} GROUP BY 2",  # telemetry column without qualifier
+    f"SELECT avg(t.value) {JOIN} WHERE value > 3",  # row-level filter
+    f"SELECT sensor_id, avg(t.value) {JOIN} GROUP BY 1",  # ambiguous
+    "SELECT avg(value) FROM telemetry WHERE value > 3",
+    "SELECT date_trunc('minute', ts), avg(value) FROM telemetry GROUP BY 1",
+    "SELECT avg(value) FROM telemetry WHERE ts > '2024-01-01'",
+    "SELECT count(*) FILTER (WHERE value > 3) FROM telemetry",
+    "SELECT avg(value) FILTER (WHERE ts >= '2024-01-01') FROM telemetry",
+    "SELECT date_trunc('day', ts, 'Asia/Kolkata') d, avg(value) FROM telemetry GROUP BY 1",
+])
+def test_not_rewritten(sql):
+    assert rewrite(sql) is None
+
+def test_without_catalog_unqualified_columns_are_refused(monkeypatch):
+    def no_catalog():
+        raise FileNotFoundError
+    monkeypatch.setattr(rollups, "get_catalog", no_catalog)
+    assert rewrite_to_rollup(validate(f"SELECT unit, avg(t.value) {JOIN} GROUP BY unit")) is None
@@ -0,0 +1,36 @@
+import asyncio, time
+import httpx
+import pytest
+import numpy as np
+import service
+
+@pytest.mark.parametrize("leader_timings", [True, False])
+def test_coalesced_requests_get_their_own_timings(monkeypatch, leader_timings):
+    calls = []
+
+    def answer(question, timings=False, qvec=None, on_sql=None, on_preview=None):
+        calls.append(question)
+        time.sleep(0.2)
+        res = {"sql": "SELECT 1", "rows": 1, "preview": [{"x": 1}]}
+        return {**res, "timings": {"total_ms": 1.0, "spans": []}} if timings else res
+
+    async def embed(question):
+        return np.zeros(4, dtype=np.float32)
+
+    monkeypatch.setattr(service.pipeline, "answer", answer)
+    monkeypatch.setattr(service._batcher, "embed", embed)
+
+    async def main():
+        transport = httpx.ASGITransport(app=service.api)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            leader = asyncio.create_task(
+                client.post("/answer", json={"question": "Bed height?", "timings": leader_timings}))
+            await asyncio.sleep(0.05)
+            joiner = await client.post("/answer", json={"question": "bed height?", "timings": not leader_timings})
+            return await leader, joiner
+
+    first, second = asyncio.run(main())
+    with_t, without = (first, second) if leader_timings else (second, first)
+    assert calls == ["Bed height?"]
+    assert "timings" in with_t.json() and "timings" not in without.json()
+    assert without.json()["rows"] == 1
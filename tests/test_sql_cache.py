@@ -0,0 +1,25 @@
+import numpy as np
+from sql_cache import SemanticSQLCache, question_facts
+
+def _vec(*xs):
+    v = np.array(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_near_duplicate_question_hits():
+    cache = SemanticSQLCache(threshold=0.95)
+    cache.put("Average bed height on Jig-1 in the last 24 hours?", _vec(1, 0.01), "SELECT 1")
+    hit = cache.get(_vec(1, 0.02), "average bed height on jig-1 over the last 24 hours")
+    assert hit["sql"] == "SELECT 1" and hit["score"] > 0.95
+
+def test_other_machine_or_window_misses_despite_cosine():
+    cache = SemanticSQLCache(threshold=0.95)
+    cache.put("Average bed height on Jig-1 in the last 24 hours?", _vec(1, 0), "SELECT 1")
+    assert cache.get(_vec(1, 0), "Average bed height on Jig-2 in the last 24 hours?") is None
+    assert cache.get(_vec(1, 0), "Average bed height on Jig-1 in the last 7 days?") is None
+    assert cache.get(_vec(1, 0), "Average bed height on Jig-1 in the last 24 days?") is None
+
+def test_quoted_literals_must_match():
+    cache = SemanticSQLCache(threshold=0.95)
+    cache.put("max of 'bed_height_mm' on Jig-1", _vec(1, 0), "SELECT 1")
+    assert cache.get(_vec(1, 0), "max of 'feed_rate_tph' on Jig-1") is None
+    assert question_facts("Max of 'Bed_Height_mm' on JIG-1") == question_facts("max of 'bed_height_mm' on jig-1")
@@ -0,0 +1,49 @@
+import pytest
+from sqlguard import validate
+
+@pytest.mark.parametrize("sql, reason", [
+    ("WITH d AS (DELETE FROM telemetry RETURNING *) SELECT * FROM d", "forbidden-delete"),
+    ("WITH u AS (UPDATE sensors SET unit = 'x' RETURNING *) SELECT count(*) FROM u", "forbidden-update"),
+    ("SELECT * INTO telemetry_copy FROM telemetry", "forbidden-into"),
+    ("SELECT * FROM sensors FOR UPDATE", "forbidden-lock"),
+    ("SELECT 1; DROP TABLE sensors", "multiple-statements"),
+    ("SELECT 1; SELECT 2", "multiple-statements"),
+    ("DELETE FROM telemetry", "not-select"),
+    ("", "empty"),
+])
+def test_rejects(sql, reason):
+    g = validate(sql)
+    assert not g.ok
+    assert g.reason == reason
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 'update' AS analyze_me FROM sensors WHERE description = 'analyze; delete'",
+    'SELECT name AS "update" FROM machines',
+    "WITH recent AS (SELECT * FROM telemetry WHERE ts > now() - interval '1 hour') SELECT avg(value) FROM recent",
+    "SELECT name FROM sensors UNION SELECT name FROM machines",
+])
+def test_accepts_read_only(sql):
+    assert validate(sql).ok
+
+def test_tables_and_columns_resolve_aliases():
+    g = validate("SELECT s.name, avg(t.value) FROM telemetry t JOIN sensors s ON s.sensor_id = t.sensor_id GROUP BY 1")
+    assert g.tables == {"telemetry", "sensors"}
+    assert ("telemetry", "value") in g.columns and ("sensors", "name") in g.columns
+
+def test_canonical_normalizes_equivalent_sql():
+    a = validate("select s.name from sensors s where s.name = 'Jig-1'")
+    b = validate("SELECT s.name\n  FROM sensors AS s WHERE s.name = 'Jig-1'  -- tag")
+    assert a.lossless and b.lossless
+    assert a.canonical == b.canonical
+
+def test_canonical_keeps_string_case():
+    assert validate("SELECT 1 FROM machines WHERE name = 'Jig-1'").canonical != \
+        validate("SELECT 1 FROM machines WHERE name = 'jig-1'").canonical
+
+def test_canonical_not_lossy():
+    # sqlglot parses date_trunc's time zone away; the two must not share a key
+    zoned = validate("SELECT date_trunc('day', ts, 'Asia/Kolkata') d, avg(value) FROM telemetry GROUP BY 1")
+    utc = validate("SELECT date_trunc('day', ts) d, avg(value) FROM telemetry GROUP BY 1")
+    assert not zoned.lossless and utc.lossless
+    assert zoned.canonical != utc.canonical
+    assert "Asia/Kolkata" in zoned.canonical
@@ -0,0 +1,132 @@
+import os, time, bisect, threading, contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no exporter
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt(self.labels, k)} {v:g}" for k, v in items]
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, tuple(buckets)
+        self._values: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            if i < len(self.buckets):
+                v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def _lines(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for k, v in items:
+            acc = 0
+            for b, n in zip(self.buckets, v):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt(self.labels + ('le',), k + (f'{b:g}',))} {acc}")
+            out.append(f"{self.name}_bucket{_fmt(self.labels + ('le',), k + ('+Inf',))} {v[-1]}")
+            out.append(f"{self.name}_sum{_fmt(self.labels, k)} {v[-2]:g}")
+            out.append(f"{self.name}_count{_fmt(self.labels, k)} {v[-1]}")
+        return out
+
+def _fmt(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+STAGE_SECONDS = Histogram("nl2sql_stage_seconds", "Time spent per pipeline stage.", ("stage",))
+ANSWERS = Counter("nl2sql_answers_total", "Answered questions by outcome.", ("outcome",))
+SQL_CACHE = Counter("nl2sql_sql_cache_total", "Semantic SQL cache lookups.", ("result",))
+REPAIRS = Counter("nl2sql_repairs_total", "Repair attempts after a failed execution.", ("result", "path"))
+UNSAFE_SQL = Counter("nl2sql_unsafe_sql_total", "Generated SQL rejected by the guard.")
+LLM_TOKENS = Counter("nl2sql_llm_tokens_total", "Tokens reported by Ollama.", ("kind",))
+METRICS = [STAGE_SECONDS, ANSWERS, SQL_CACHE, REPAIRS, UNSAFE_SQL, LLM_TOKENS]
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    out = []
+    for m in METRICS:
+        out += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {'histogram' if isinstance(m, Histogram) else 'counter'}"]
+        out += m._lines()
+    return "\n".join(out) + "\n"
+
+# spans of the trace the current call belongs to, and how deep we are in it
+_spans: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar("spans", default=None)
+_depth: contextvars.ContextVar[int] = contextvars.ContextVar("depth", default=0)
+
+@contextmanager
+def trace():
+    """Collect every span opened below this point (also across asyncio tasks and to_thread)."""
+    spans: List[Dict] = []
+    token = _spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _spans.reset(token)
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time a stage: always feeds the stage histogram, and the current trace if there is one.
+    Yields a dict; whatever the block puts in it is kept on the span."""
+    spans, depth = _spans.get(), _depth.get()
+    rec = {"stage": stage, "depth": depth, **attrs}
+    if spans is not None:
+        spans.append(rec)
+    token = _depth.set(depth + 1)
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        rec["error"] = type(e).__name__
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        _depth.reset(token)
+        rec["ms"] = round(dt * 1000, 3)
+        STAGE_SECONDS.observe(dt, stage=stage)
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve render() on /metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server